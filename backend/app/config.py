@@ -25,9 +25,32 @@ class Settings(BaseSettings):
     CORS_ALLOW_METHODS: str = "*"
 
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: str | None = None  # defaults to DATABASE_URL with the asyncpg driver
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_S: float = 30.0
+    DB_POOL_RECYCLE_S: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 500
 
     OPENAI_API_KEY: str | None = None
     CHAT_MODEL: str = "gpt-4o-mini"
+    OPENAI_BASE_URL: str | None = None
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE: int = 20
+    LLM_MAX_CLIENTS: int = 32
+    LLM_BREAKER_ENABLED: bool = True
+    LLM_BREAKER_WINDOW: int = 20
+    LLM_BREAKER_MIN_CALLS: int = 5
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_SLOW_MS: int = 12000
+    LLM_BREAKER_SLOW_RATE: float = 0.8
+    LLM_BREAKER_OPEN_S: float = 30.0
+    LLM_BREAKER_HALF_OPEN_PROBES: int = 1
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY_MS: int = 1000
+    LLM_HEDGE_MIN_SAMPLES: int = 20
 
     EMBEDDING_PROVIDER: Literal["local","openai","ollama"] = "local"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -37,6 +60,16 @@ class Settings(BaseSettings):
     EMBED_REQUEST_DELAY_S: float = 1.0
     EMBED_MAX_RETRIES: int = 8
     EMBED_MAX_CONCURRENCY: int = 1
+    REINDEX_CONCURRENCY: int = 4
+    REINDEX_WAVE_DOCS: int = 32
+    REINDEX_STALE_S: int = 600
+    RECONCILE_PAGE_SIZE: int = 100
+    RECONCILE_DB_BATCH: int = 5000
+    DOCUMENTS_EXACT_COUNT_BELOW: int = 10000
+    DOCUMENTS_FUZZY_THRESHOLD: float = 0.3
+    CHUNK_EXPORT_BATCH: int = 500
+    VECTOR_DELETE_CONCURRENCY: int = 4
+    BULK_DELETE_MAX_DOCUMENTS: int = 1000
 
     OLLAMA_BASE_URL: str = "http://localhost:11434"
 
@@ -51,6 +84,55 @@ class Settings(BaseSettings):
     MAX_CONTEXT_CHUNKS: int = 6
     TOPK: int = 20
 
+    CONTEXT_COMPRESSION_ENABLED: bool = False
+    COMPRESS_MAX_SENTENCES: int = 4
+    SENTENCE_CACHE_SIZE: int = 5000
+    EXTRACTIVE_SEMANTIC_WEIGHT: float = 0.6
+    EXTRACTIVE_MAX_SIMILARITY: float = 0.9
+    EXTRACTIVE_MIN_RELATIVE_SCORE: float = 0.5
+
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_MAX_LENGTH: int = 512
+    RERANK_TOP_N: int = 4
+    RERANK_BUDGET_MS: int = 250
+    RERANK_MIN_QUERY_WORDS: int = 3
+    RERANK_CACHE_SIZE: int = 20000
+
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_MIN_SIM: float = 0.95
+    ANSWER_CACHE_TTL_S: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000
+    CONVERSATION_CACHE_ENABLED: bool = False
+    CONVERSATION_CACHE_TTL_S: int = 900
+    CONVERSATION_CACHE_MAX_SESSIONS: int = 5000
+    CONVERSATION_POOL_MAX: int = 200
+    CONVERSATION_REUSE_MIN_SIM: float = 0.5
+
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_TTL_S: int = 86400
+    LLM_CACHE_MAX_ROWS: int = 50000
+    LLM_CACHE_EVICT_EVERY: int = 200
+
+    ASK_DEADLINE_MS: int = 20000
+    ASK_DEADLINE_MAX_MS: int = 60000
+    RETRIEVAL_BUDGET_MS: int = 4000
+    COMPRESS_BUDGET_MS: int = 800
+    LLM_BUDGET_MS: int = 15000
+    ENRICH_BUDGET_MS: int = 10000
+    ASK_BATCH_MAX_QUESTIONS: int = 200
+    ASK_BATCH_SEARCH_CONCURRENCY: int = 16
+    ASK_BATCH_LLM_CONCURRENCY: int = 8
+    QUERY_WRITE_BEHIND_ENABLED: bool = True
+    QUERY_WRITE_BEHIND_BATCH: int = 200
+    QUERY_WRITE_BEHIND_INTERVAL_MS: int = 500
+    QUERY_WRITE_BEHIND_MAX_PENDING: int = 10000
+    REPUTATION_HALF_LIFE_DAYS: float = 30.0
+    REPUTATION_SMOOTHING: float = 3.0
+    REPUTATION_CHUNK_WEIGHT: float = 0.5
+    REPUTATION_FLUSH_INTERVAL_MS: int = 2000
+    REPUTATION_CACHE_TTL_S: int = 60
+
     MAX_UPLOAD_MB: int = 25
     MAX_FILES: int = 20
 
@@ -58,9 +140,27 @@ class Settings(BaseSettings):
     AUTO_ENRICH_MIN_CONF: float = 0.2
     AUTO_ENRICH_MAX_DOCS: int = 3
     AUTO_ENRICH_MAX_PER_TOPIC: int = 1
+    AUTO_ENRICH_MODE: Literal["inline","background"] = "inline"
+    ENRICH_BACKGROUND_BUDGET_MS: int = 30000
+    ENRICH_BACKGROUND_CONCURRENCY: int = 4
+    ENRICH_TICKET_TTL_S: int = 600
 
     GOOGLE_CSE_API_KEY: str | None = None
     GOOGLE_CSE_CX: str | None = None
+    GOOGLE_CSE_URL: str = "https://www.googleapis.com/customsearch/v1"
+    ENRICH_FETCH_TIMEOUT_S: float = 10.0
+    ENRICH_MAX_CONNECTIONS: int = 50
+    ENRICH_PER_DOMAIN_CONCURRENCY: int = 2
+    ENRICH_MAX_PAGE_BYTES: int = 2_000_000
+    ENRICH_MAX_PAGE_CHARS: int = 200_000
+    ENRICH_INGEST_CONCURRENCY: int = 2
+    ENRICH_USER_AGENT: str = "kb-backend/1.0 (+enrichment)"
+    WEB_CACHE_ENABLED: bool = False
+    WEB_CACHE_SEARCH_TTL_S: int = 86400
+    WEB_CACHE_PAGE_TTL_S: int = 21600
+    WEB_CACHE_NEGATIVE_TTL_S: int = 600
+    WEB_CACHE_KEEP_STALE_S: int = 604800
+    WEB_CACHE_EVICT_EVERY: int = 200
 
     @field_validator("EMBEDDING_BATCH")
     @classmethod
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.db import models
 
 def create_document(db: Session, **kwargs) -> models.Document:
@@ -12,6 +13,13 @@ def create_query(db: Session, *, workspace_id: str, question: str) -> models.Que
     db.add(obj); db.commit(); db.refresh(obj)
     return obj
 
+def upsert_queries(db: Session, rows: list[dict]) -> None:
+    if not rows: return
+    stmt = pg_insert(models.Query).values(rows)
+    cols = [c for c in rows[0] if c != "id"]
+    stmt = stmt.on_conflict_do_update(index_elements=[models.Query.id], set_={c: stmt.excluded[c] for c in cols})
+    db.execute(stmt); db.commit()
+
 def update_query(db: Session, query_id, **fields):
     q = db.get(models.Query, query_id)
     if not q: return None
@@ -19,6 +27,64 @@ def update_query(db: Session, query_id, **fields):
         setattr(q, k, v)
     db.add(q); db.commit(); db.refresh(q); return q
 
+def refresh_document_counts(db: Session, document_ids: list | None = None, *, workspace: str | None = None) -> None:
+    """Recompute documents.chunk_count / vector_count in one statement (for the given documents or a whole workspace)."""
+    d, c, v = models.Document, models.Chunk, models.VectorRecord
+    stmt = update(d).values(
+        chunk_count=select(func.count()).where(c.document_id == d.id).scalar_subquery(),
+        vector_count=select(func.count()).where(v.document_id == d.id).scalar_subquery(),
+    )
+    if document_ids is not None:
+        if not document_ids: return
+        stmt = stmt.where(d.id.in_(document_ids))
+    if workspace is not None:
+        stmt = stmt.where(d.workspace_id == workspace)
+    db.execute(stmt.execution_options(synchronize_session=False))
+
+def replace_chunks(db: Session, document_id, parts: list[dict]) -> list[models.Chunk]:
+    """
+    Swap a document's chunks for `parts` (chunk_text output). Rows whose text
+    hash is unchanged are kept and renumbered, so their ids (and vectors) survive.
+    """
+    old = db.query(models.Chunk).filter(models.Chunk.document_id == document_id).order_by(models.Chunk.idx).all()
+    by_sha: dict[str, list[models.Chunk]] = {}
+    for ch in old:
+        by_sha.setdefault(ch.sha256, []).append(ch)
+    rows, kept = [], set()
+    for i, p in enumerate(parts):
+        same = by_sha.get(p["sha256"])
+        if same:
+            ch = same.pop(0)
+            kept.add(ch.id)
+        else:
+            ch = models.Chunk(document_id=document_id, text=p["text"], token_count=p["token_count"],
+                              sha256=p["sha256"], page_start=None, page_end=None)
+        rows.append((i, ch))
+    for ch in old:
+        if ch.id not in kept:
+            db.delete(ch)
+    db.flush()
+    # park kept rows on negative positions first: (document_id, idx) is unique
+    for i, ch in rows:
+        if ch.id in kept:
+            ch.idx = -1 - i
+    db.flush()
+    for i, ch in rows:
+        ch.idx = i
+        db.add(ch)
+    db.flush()
+    refresh_document_counts(db, [document_id])
+    db.commit()
+    return [ch for _, ch in rows]
+
+def delete_documents(db: Session, document_ids: list) -> int:
+    """Set-based delete: chunks in one statement, then the documents (vector_records cascade)."""
+    if not document_ids: return 0
+    db.execute(delete(models.Chunk).where(models.Chunk.document_id.in_(document_ids)))
+    n = db.execute(delete(models.Document).where(models.Document.id.in_(document_ids))).rowcount or 0
+    db.commit()
+    return n
+
 def get_chunks_by_ids(db: Session, ids: list) -> list[models.Chunk]:
     if not ids: return []
     return db.query(models.Chunk).filter(models.Chunk.id.in_(ids)).all()
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Text, Integer, ForeignKey, JSON, Index, CheckConstraint, func
+from sqlalchemy import Boolean, String, Text, Integer, ForeignKey, JSON, Index, CheckConstraint, func
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from datetime import datetime
 import uuid
@@ -7,6 +7,10 @@ import uuid
 class Base(DeclarativeBase):
     pass
 
+def _has_pg_trgm(ddl, target, bind, **kw) -> bool:
+    # create_all (dev) skips trigram indexes where the extension could not be installed
+    return bind is not None and bind.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first() is not None
+
 class Document(Base):
     __tablename__ = "documents"
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -18,12 +22,18 @@ class Document(Base):
     file_sha256: Mapped[str | None] = mapped_column(String(64), index=True)
     status: Mapped[str] = mapped_column(String(16), default="uploaded")  # uploaded|processed|failed
     meta: Mapped[dict | None] = mapped_column(JSON, default=None)
+    chunk_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")   # maintained by crud.refresh_document_counts
+    vector_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")  # vectors per vector_records
     created_at: Mapped[datetime] = mapped_column(default=func.now())
     updated_at: Mapped[datetime] = mapped_column(default=func.now(), onupdate=func.now())
     chunks: Mapped[list["Chunk"]] = relationship(back_populates="document", cascade="all, delete-orphan")
     __table_args__ = (
         CheckConstraint("status in ('uploaded','processed','failed')", name="documents_status_chk"),
         Index("ix_documents_workspace_status", "workspace_id", "status"),
+        Index("ix_documents_workspace_storage_uri", "workspace_id", "storage_uri"),
+        Index("ix_documents_workspace_created_id", "workspace_id", "created_at", "id"),
+        Index("ix_documents_filename_trgm", "filename", postgresql_using="gin",
+              postgresql_ops={"filename": "gin_trgm_ops"}).ddl_if(callable_=_has_pg_trgm),
     )
 
 class Chunk(Base):
@@ -40,6 +50,19 @@ class Chunk(Base):
     document: Mapped["Document"] = relationship(back_populates="chunks")
     __table_args__ = (Index("ix_chunks_doc_idx", "document_id", "idx", unique=True),)
 
+class VectorRecord(Base):
+    """What the vector store holds for a chunk; no FK on chunk_id so vectors of deleted chunks stay traceable."""
+    __tablename__ = "vector_records"
+    chunk_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    document_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    workspace_id: Mapped[str] = mapped_column(String(64))
+    vector_id: Mapped[str] = mapped_column(String(256))
+    sha256: Mapped[str | None] = mapped_column(String(64))
+    idx: Mapped[int] = mapped_column(Integer)
+    model: Mapped[str] = mapped_column(String(128))
+    dim: Mapped[int] = mapped_column(Integer)
+    indexed_at: Mapped[datetime] = mapped_column(default=func.now(), onupdate=func.now())
+
 class Query(Base):
     __tablename__ = "queries"
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -50,6 +73,7 @@ class Query(Base):
     missing_info: Mapped[list[str] | None] = mapped_column(ARRAY(String), default=None)
     suggested_enrichment: Mapped[list[str] | None] = mapped_column(ARRAY(String), default=None)
     used_chunk_ids: Mapped[list[uuid.UUID] | None] = mapped_column(ARRAY(UUID(as_uuid=True)), default=None)
+    used_document_ids: Mapped[list[uuid.UUID] | None] = mapped_column(ARRAY(UUID(as_uuid=True)), default=None)
     created_at: Mapped[datetime] = mapped_column(default=func.now())
     __table_args__ = (Index("ix_queries_workspace_created", "workspace_id", "created_at"),)
 
@@ -60,7 +84,17 @@ class Feedback(Base):
     rating: Mapped[int] = mapped_column()
     comment: Mapped[str | None] = mapped_column(Text, default=None)
     created_at: Mapped[datetime] = mapped_column(default=func.now())
-    
+
+class PendingFeedback(Base):
+    """Feedback for a query another worker has not written yet; moved to feedback once the query row exists."""
+    __tablename__ = "pending_feedback"
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    query_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
+    workspace_id: Mapped[str] = mapped_column(String(64))
+    rating: Mapped[int] = mapped_column()
+    comment: Mapped[str | None] = mapped_column(Text, default=None)
+    created_at: Mapped[datetime] = mapped_column(default=func.now(), index=True)
+
 class DocumentReputation(Base):
     __tablename__ = "document_reputation"
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -68,6 +102,62 @@ class DocumentReputation(Base):
     document_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
     up_count: Mapped[int] = mapped_column(Integer, default=0)
     down_count: Mapped[int] = mapped_column(Integer, default=0)
-    score: Mapped[float] = mapped_column()  # smoothed reputation
+    up_weight: Mapped[float] = mapped_column(default=0.0, server_default="0")    # votes decayed to updated_at
+    down_weight: Mapped[float] = mapped_column(default=0.0, server_default="0")
+    score: Mapped[float] = mapped_column()  # smoothed reputation as of updated_at
     updated_at: Mapped[datetime] = mapped_column(default=func.now(), onupdate=func.now())
     __table_args__ = (Index("ix_docrep_ws_doc", "workspace_id", "document_id", unique=True),)
+
+class ChunkReputation(Base):
+    __tablename__ = "chunk_reputation"
+    chunk_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("chunks.id", ondelete="CASCADE"), primary_key=True)
+    workspace_id: Mapped[str] = mapped_column(String(64), index=True)
+    up_count: Mapped[int] = mapped_column(Integer, default=0)
+    down_count: Mapped[int] = mapped_column(Integer, default=0)
+    up_weight: Mapped[float] = mapped_column(default=0.0)
+    down_weight: Mapped[float] = mapped_column(default=0.0)
+    score: Mapped[float] = mapped_column(default=0.0)
+    updated_at: Mapped[datetime] = mapped_column(default=func.now(), onupdate=func.now())
+
+class LLMCompletion(Base):
+    __tablename__ = "llm_completions"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256(model, prompt version, question, chunk shas)
+    model: Mapped[str] = mapped_column(String(128))
+    response: Mapped[dict] = mapped_column(JSON)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(default=func.now(), index=True)
+    last_used_at: Mapped[datetime] = mapped_column(default=func.now(), index=True)
+
+class WebCacheEntry(Base):
+    __tablename__ = "web_cache"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256(kind, cx/url, topic)
+    kind: Mapped[str] = mapped_column(String(16))                   # search | page
+    target: Mapped[str] = mapped_column(Text)                        # topic or URL
+    ok: Mapped[bool] = mapped_column(Boolean, default=True)          # False: negative entry for a failed call
+    data: Mapped[dict | None] = mapped_column(JSON, default=None)    # {"items": [...]} or {"text": ...}
+    etag: Mapped[str | None] = mapped_column(String(512), default=None)
+    last_modified: Mapped[str | None] = mapped_column(String(64), default=None)
+    fetched_at: Mapped[datetime] = mapped_column(default=func.now())
+    expires_at: Mapped[datetime] = mapped_column(index=True)
+
+class ReindexJob(Base):
+    __tablename__ = "reindex_jobs"
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    workspace_id: Mapped[str] = mapped_column(String(64), default="default")
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending|running|cancelling|cancelled|interrupted|done|failed
+    force: Mapped[bool] = mapped_column(Boolean, default=False)
+    clear_first: Mapped[bool] = mapped_column(Boolean, default=False)
+    document_ids: Mapped[list[uuid.UUID]] = mapped_column(ARRAY(UUID(as_uuid=True)))
+    done_ids: Mapped[list[uuid.UUID]] = mapped_column(ARRAY(UUID(as_uuid=True)), default=list)  # handled so far; resume skips these
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    skipped: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    chunks: Mapped[int] = mapped_column(Integer, default=0)
+    elapsed_s: Mapped[float] = mapped_column(default=0.0)  # summed over runs, for throughput
+    errors: Mapped[dict | None] = mapped_column(JSON, default=None)  # document id -> error (first few)
+    error: Mapped[str | None] = mapped_column(Text, default=None)
+    created_at: Mapped[datetime] = mapped_column(default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(default=func.now(), onupdate=func.now())  # heartbeat while running
+    finished_at: Mapped[datetime | None] = mapped_column(default=None)
+    __table_args__ = (Index("ix_reindex_jobs_workspace_created", "workspace_id", "created_at"),)
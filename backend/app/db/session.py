@@ -1,14 +1,45 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, future=True)
+def _pool_args() -> dict:
+    # recycle instead of pinging on every checkout; DB_POOL_PRE_PING for networks that drop idle connections early
+    return dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_S,
+        pool_recycle=settings.DB_POOL_RECYCLE_S,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+engine = create_engine(settings.DATABASE_URL, future=True, **_pool_args())
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+def _async_url() -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg")
+    return url.render_as_string(hide_password=False)
+
+# asyncpg prepares each statement once per connection and reuses it from this cache (0 behind pgbouncer transaction pooling)
+_aurl = _async_url()
+async_engine = create_async_engine(
+    _aurl, **_pool_args(),
+    connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    if make_url(_aurl).get_driver_name() == "asyncpg" else {},
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,12 +1,16 @@
 import logging
 from fastapi import FastAPI, APIRouter
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
 from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.logging_config import setup_console_logging
 from app.request_logging import AccessLogMiddleware
 from app.db.models import Base
-from app.db.session import engine
+from app.db.session import engine, async_engine
+from app.services.llm import aclose_clients
+from app.services import enrich_jobs, query_log, reindex, reputation, webfetch
 from app.routers import health, upload, ask, documents, feedback
 
 def create_app() -> FastAPI:
@@ -21,6 +25,11 @@ def create_app() -> FastAPI:
     )
 
     # Create tables (dev convenience; for prod use Alembic)
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except SQLAlchemyError as e:
+        logging.getLogger("app").warning("pg_trgm unavailable, filename search is unindexed: %s", e.__class__.__name__)
     Base.metadata.create_all(bind=engine)
 
     app.add_middleware(
@@ -46,6 +55,17 @@ def create_app() -> FastAPI:
     api.include_router(feedback.router, tags=["feedback"])
 
     app.include_router(api)
+
+    async def _shutdown():
+        await enrich_jobs.cancel_all()
+        await run_in_threadpool(reindex.stop)  # waits for running waves
+        await run_in_threadpool(query_log.stop)  # joins the flusher
+        await run_in_threadpool(reputation.stop)
+        await aclose_clients()
+        await webfetch.aclose()
+        await async_engine.dispose()
+
+    app.add_event_handler("shutdown", _shutdown)
     logging.getLogger("app").info("Backend started: %s", settings.APP_NAME)
     return app
 
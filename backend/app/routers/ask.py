@@ -1,59 +1,152 @@
+import asyncio
+import json
+import time
+import anyio
+from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from typing import Any, Dict, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-from app.db.session import get_db
-from app.db import crud
+from app.db.session import get_async_db, AsyncSessionLocal
 from app.deps import workspace_header, openai_key_header
 from app.config import settings
 
-from app.services.rag import retrieve_topk, build_context_block, map_confidence
+from app.services.rag import (
+    aretrieve_topk, build_context_block, doc_meta_map, map_confidence, embed_query, rank_matches_batch, vector_search,
+)
+from app.services.embedding import embed_batch
 from app.services.answer_fallback import extractive_answer
-from app.services.enrich import auto_enrich
 from app.services.rag import origin_summary
+from app.services.compress import compress_rows
+from app.services.rerank import rerank
+from app.services import answer_cache, enrich_jobs, llm_cache, query_log
+from app.services.conversation import conversation_key
+from app.services.llm import chat_breaker, chat_completion, get_async_client, is_provider_failure
+from app.services.breaker import CircuitOpenError
+from app.services.deadline import Deadline
+from app.services.stream import JsonFieldStreamer, ndjson_line, ndjson_stream, sse_event, sse_stream
 
 router = APIRouter()
 
+# Bump PROMPT_VERSION whenever SYSTEM_PROMPT or the user template changes so
+# cached completions produced by the old prompt are no longer served.
+PROMPT_VERSION = "v1"
+SYSTEM_PROMPT = (
+    "You are a retrieval-augmented assistant. Use ONLY the provided context to answer. "
+    "If insufficient, say what is missing. Cite as [1],[2],… referring to the Context."
+)
 
-def _call_llm_json(
+
+def _llm_messages(standalone: str, context_block: str) -> List[Dict[str, str]]:
+    user = (
+        f"Standalone question:\n{standalone}\n\nContext:\n{context_block}\n\n"
+        "Return a JSON object with keys: answer, confidence (high|medium|low), "
+        "missing_info (array of strings), suggested_enrichment (array of strings)."
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user},
+    ]
+
+
+async def _call_llm_json(
     *,
     standalone: str,
     context_block: str,
     openai_key: str | None,
+    deadline: Deadline | None = None,
 ) -> Dict[str, Any] | None:
     key = openai_key or settings.OPENAI_API_KEY
     if not key:
         return None
+    budget = deadline.child(settings.LLM_BUDGET_MS).remaining() if deadline else None
+    if budget is not None and budget <= 0:
+        deadline.skip("llm")
+        return None
     try:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=key)
-        system = (
-            "You are a retrieval-augmented assistant. Use ONLY the provided context to answer. "
-            "If insufficient, say what is missing. Cite as [1],[2],… referring to the Context."
-        )
-        user = (
-            f"Standalone question:\n{standalone}\n\nContext:\n{context_block}\n\n"
-            "Return a JSON object with keys: answer, confidence (high|medium|low), "
-            "missing_info (array of strings), suggested_enrichment (array of strings)."
-        )
-        resp = client.chat.completions.create(
+        resp = await chat_completion(
+            key,
             model=settings.CHAT_MODEL,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
+            messages=_llm_messages(standalone, context_block),
             temperature=0.2,
             response_format={"type": "json_object"},
+            timeout=budget,
         )
-        import json
-
         return json.loads(resp.choices[0].message.content)
+    except (asyncio.TimeoutError, CircuitOpenError):
+        if deadline:
+            deadline.skip("llm")
+        return None
     except Exception:
         return None
 
 
+async def _stream_llm_json(
+    *,
+    standalone: str,
+    context_block: str,
+    openai_key: str,
+    first_token_timeout: float | None = None,
+) -> AsyncIterator[str]:
+    """Yield raw content deltas of a streamed json_object completion.
+
+    `first_token_timeout` bounds the wait for the first chunk
+    (asyncio.TimeoutError); once tokens flow the stream is not cut. Closing
+    the generator (e.g. when the client disconnects and the response task is
+    cancelled) closes the upstream HTTP stream as well. The provider circuit
+    breaker judges the stream by its time to first token.
+    """
+    probe = chat_breaker.acquire() if settings.LLM_BREAKER_ENABLED else False
+    pending, t0, stream = True, time.monotonic(), None
+
+    def _verdict(ok: bool | None) -> None:
+        nonlocal pending
+        if pending and settings.LLM_BREAKER_ENABLED:
+            if ok is None:
+                chat_breaker.release(probe)
+            else:
+                chat_breaker.record(ok, time.monotonic() - t0, probe=probe)
+        pending = False
+
+    try:
+        stream = await asyncio.wait_for(
+            get_async_client(openai_key).chat.completions.create(
+                model=settings.CHAT_MODEL,
+                messages=_llm_messages(standalone, context_block),
+                temperature=0.2,
+                response_format={"type": "json_object"},
+                stream=True,
+            ),
+            first_token_timeout,
+        )
+        chunks = stream.__aiter__()
+        while True:
+            try:
+                if pending:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), first_token_timeout)
+                else:
+                    chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                break
+            if chunk.choices and chunk.choices[0].delta.content:
+                _verdict(True)
+                yield chunk.choices[0].delta.content
+        _verdict(True)
+    except asyncio.TimeoutError:
+        # cut short by the caller's budget: only informative once it is already slow
+        _verdict(True if time.monotonic() - t0 >= chat_breaker.slow_s else None)
+        raise
+    except BaseException as e:
+        _verdict(False if is_provider_failure(e) else None)
+        raise
+    finally:
+        if stream is not None:
+            with anyio.CancelScope(shield=True):
+                await stream.close()
+
+
 def _make_out(
     *,
     query_id: str,
@@ -63,6 +156,8 @@ def _make_out(
     suggested_enrichment: List[str],
     citations: List[Dict[str, Any]],
     enrichment_meta: Dict[str, Any] | None = None,
+    cached: bool = False,
+    latency: Dict[str, Any] | None = None,
 ) -> Dict[str, Any]:
     out = {
         "query_id": query_id,
@@ -71,64 +166,179 @@ def _make_out(
         "missing_info": missing_info,
         "suggested_enrichment": suggested_enrichment,
         "citations": citations,
-        "origin": origin_summary(citations)
+        "origin": origin_summary(citations),
+        "cached": cached,
     }
     if enrichment_meta:
         out["enrichment"] = enrichment_meta
+    if latency:
+        out["latency"] = latency
     return out
 
 
-def _persist_query(db: Session, qrow, out: Dict[str, Any]) -> None:
-    conf_map = {"low": 0.2, "medium": 0.6, "high": 0.9}
-    used_chunk_ids = [
-        c["chunk_id"] for c in out.get("citations", []) if "chunk_id" in c
-    ]
-    crud.update_query(
-        db,
-        qrow.id,
-        answer=out.get("answer", ""),
-        confidence=conf_map.get(out.get("confidence", "medium"), 0.5),
-        missing_info=out.get("missing_info") or [],
-        suggested_enrichment=out.get("suggested_enrichment") or [],
-        used_chunk_ids=used_chunk_ids,
+async def _record_query(query_id: UUID, workspace: str, question: str, out: Dict[str, Any]) -> None:
+    # write-behind: the row is flushed in the background unless the buffer is off or full
+    r = query_log.row(query_id=query_id, workspace=workspace, question=question, out=out)
+    if not query_log.record(r):
+        await run_in_threadpool(query_log.write_now, [r])
+
+def _conversation(workspace: str, question: str, payload: Dict[str, Any]) -> str | None:
+    if not settings.CONVERSATION_CACHE_ENABLED:
+        return None
+    history = payload.get("history") if isinstance(payload.get("history"), list) else None
+    return conversation_key(workspace, question, history, payload.get("conversation_id"))
+
+def _cacheable(out: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: out[k] for k in ("answer", "confidence", "missing_info", "suggested_enrichment", "citations")}
+
+async def _build_context(
+    db: AsyncSession, standalone: str, rows, deadline: Deadline, doc_meta: Dict[str, Any] | None = None
+) -> Tuple[list, str, List[Dict[str, Any]]]:
+    max_ctx = settings.MAX_CONTEXT_CHUNKS
+    if settings.RERANK_ENABLED:
+        budget_ms = deadline.child(settings.RERANK_BUDGET_MS).remaining() * 1000
+        reranked = False
+        if budget_ms > 0:
+            rows, reranked = await run_in_threadpool(rerank, standalone, rows, budget_ms=budget_ms)
+        if reranked:
+            max_ctx = min(max_ctx, settings.RERANK_TOP_N)
+        else:
+            deadline.skip("rerank")  # vector order: keep the full context
+    ctx_rows = rows[:max_ctx]  # (you decided to skip MMR)
+
+    async def _compress():
+        if not settings.CONTEXT_COMPRESSION_ENABLED:
+            return None
+        try:
+            return await asyncio.wait_for(
+                run_in_threadpool(compress_rows, standalone, ctx_rows),
+                deadline.child(settings.COMPRESS_BUDGET_MS).remaining(),
+            )
+        except asyncio.TimeoutError:
+            deadline.skip("compression")
+            return None
+
+    async def _doc_meta():
+        return doc_meta if doc_meta is not None else await db.run_sync(doc_meta_map, ctx_rows)
+
+    text_by_chunk, doc_meta = await asyncio.gather(_compress(), _doc_meta())
+    context_block, citations = build_context_block(ctx_rows, doc_meta=doc_meta, text_by_chunk=text_by_chunk)
+    return ctx_rows, context_block, citations
+
+def _completion_key(standalone: str, ctx_rows) -> str:
+    version = PROMPT_VERSION
+    if settings.CONTEXT_COMPRESSION_ENABLED:
+        version += f"+c{settings.COMPRESS_MAX_SENTENCES}"
+    return llm_cache.completion_key(
+        model=settings.CHAT_MODEL,
+        prompt_version=version,
+        question=standalone,
+        chunk_shas=[r.sha256 or str(r.id) for r in ctx_rows],
     )
 
-def _first_pass_answer(
+async def _llm_answer(
     *,
-    db: Session,
-    workspace: str,
+    db: AsyncSession,
     standalone: str,
+    ctx_rows,
+    context_block: str,
     openai_key: str | None,
-) -> Tuple[List[Dict[str, Any]], str, Dict[str, Any]]:
-    matches, rows, avg_score = retrieve_topk(
-        db, query_text=standalone, workspace=workspace, api_key=None
+    deadline: Deadline,
+) -> Dict[str, Any] | None:
+    if not settings.LLM_CACHE_ENABLED:
+        return await _call_llm_json(
+            standalone=standalone, context_block=context_block, openai_key=openai_key, deadline=deadline
+        )
+
+    key = _completion_key(standalone, ctx_rows)
+    data = await db.run_sync(llm_cache.get, key)
+    if data is not None:
+        return data
+    data = await _call_llm_json(
+        standalone=standalone, context_block=context_block, openai_key=openai_key, deadline=deadline
     )
+    if data and data.get("answer"):
+        await db.run_sync(llm_cache.put, key, data)
+    return data
+
+def _no_results_data(standalone: str) -> Dict[str, Any]:
+    return {
+        "answer": "I couldn’t find relevant information in your uploaded documents.",
+        "confidence": "low",
+        "missing_info": ["Documents that cover this topic", standalone],
+        "suggested_enrichment": ["Upload more domain-relevant files"],
+    }
+
+def _extractive_data(standalone: str, ctx_rows, avg_score: float, q_vec: List[float] | None = None) -> Dict[str, Any]:
+    return {
+        "source": "extractive",
+        "answer": extractive_answer(standalone, ctx_rows, q_vec=q_vec),
+        "confidence": map_confidence(avg_score, len(ctx_rows)),
+        "missing_info": ["More comprehensive sources may be required", standalone],
+        "suggested_enrichment": [
+            "Enable auto-enrichment or upload additional documents"
+        ],
+    }
+
+def _timed_out_data(standalone: str) -> Dict[str, Any]:
+    return {
+        "answer": "Searching your documents took too long; please try again.",
+        "confidence": "low",
+        "missing_info": [standalone],
+        "suggested_enrichment": [],
+    }
+
+async def _retrieve(
+    db: AsyncSession, *, workspace: str, standalone: str, deadline: Deadline, conversation: str | None = None
+):
+    """Embed the question, then either hit the answer cache or run retrieval.
+
+    Embedding and the vector query share RETRIEVAL_BUDGET_MS; on timeout the
+    stage is reported as skipped and no rows are returned.
+    """
+    stage = deadline.child(settings.RETRIEVAL_BUDGET_MS)
+    try:
+        q_vec = await asyncio.wait_for(run_in_threadpool(embed_query, standalone), stage.remaining())
+    except asyncio.TimeoutError:
+        deadline.skip("retrieval")
+        return None, None, [], 0.0
+    if settings.ANSWER_CACHE_ENABLED:
+        hit = await db.run_sync(answer_cache.lookup, workspace, q_vec)
+        if hit:
+            return q_vec, hit, [], 0.0
+    try:
+        _, rows, avg_score = await aretrieve_topk(
+            db, query_text=standalone, workspace=workspace, api_key=None, q_vec=q_vec,
+            timeout=stage.remaining(), conversation=conversation,
+        )
+    except asyncio.TimeoutError:
+        deadline.skip("retrieval")
+        return q_vec, None, [], 0.0
+    return q_vec, None, rows, avg_score
 
+async def _first_pass_answer(
+    *,
+    db: AsyncSession,
+    standalone: str,
+    openai_key: str | None,
+    rows,
+    avg_score: float,
+    deadline: Deadline,
+    q_vec: List[float] | None = None,
+) -> Tuple[List[Dict[str, Any]], str, Dict[str, Any], float]:
     if not rows:
-        data = {
-            "answer": "I couldn’t find relevant information in your uploaded documents.",
-            "confidence": "low",
-            "missing_info": ["Documents that cover this topic", standalone],
-            "suggested_enrichment": ["Upload more domain-relevant files"],
-        }
         citations: List[Dict[str, Any]] = []
+        data = _timed_out_data(standalone) if "retrieval" in deadline.skipped else _no_results_data(standalone)
         return citations, "low", data, avg_score
 
-    ctx_rows = rows[: settings.MAX_CONTEXT_CHUNKS]  # (you decided to skip MMR)
-    context_block, citations = build_context_block(ctx_rows, db=db)
+    ctx_rows, context_block, citations = await _build_context(db, standalone, rows, deadline)
 
-    data = _call_llm_json(
-        standalone=standalone, context_block=context_block, openai_key=openai_key
+    data = await _llm_answer(
+        db=db, standalone=standalone, ctx_rows=ctx_rows,
+        context_block=context_block, openai_key=openai_key, deadline=deadline,
     )
     if not data:
-        data = {
-            "answer": extractive_answer(standalone, ctx_rows),
-            "confidence": map_confidence(avg_score, len(ctx_rows)),
-            "missing_info": ["More comprehensive sources may be required", standalone],
-            "suggested_enrichment": [
-                "Enable auto-enrichment or upload additional documents"
-            ],
-        }
+        data = await run_in_threadpool(_extractive_data, standalone, ctx_rows, avg_score, q_vec)
 
     conf = data.get("confidence")
     if conf not in {"high", "medium", "low"}:
@@ -136,15 +346,18 @@ def _first_pass_answer(
 
     return citations, data["confidence"], data, avg_score
 
-def _maybe_enrich_and_retry(
+async def _maybe_enrich_and_retry(
     *,
-    db: Session,
+    db: AsyncSession,
     workspace: str,
     standalone: str,
     data: Dict[str, Any],
     citations: List[Dict[str, Any]],
     openai_key: str | None,
     auto_enrich_flag: bool,
+    deadline: Deadline,
+    q_vec: List[float] | None = None,
+    budget_ms: int | None = None,
 ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any] | None]:
     if not auto_enrich_flag:
         return data, citations, None
@@ -153,31 +366,43 @@ def _maybe_enrich_and_retry(
     if not topics:
         topics = [standalone]
 
-    added_ids = auto_enrich(
-        db=db,
-        workspace=workspace,
-        topics=topics,
-        openai_key=openai_key or settings.OPENAI_API_KEY,
-        max_docs=settings.AUTO_ENRICH_MAX_DOCS,
-        max_per_topic=settings.AUTO_ENRICH_MAX_PER_TOPIC,
-    )
+    budget = deadline.child(budget_ms or settings.ENRICH_BUDGET_MS).remaining()
+    if budget < 1.0:
+        deadline.skip("enrichment")
+        return data, citations, {"added_docs": 0}
+    try:
+        # small grace over the budget: the engine itself stops waiting at `budget`
+        added_ids = await asyncio.wait_for(enrich_jobs.enrich_topics(
+            workspace=workspace,
+            topics=topics,
+            openai_key=openai_key or settings.OPENAI_API_KEY,
+            time_budget_s=budget,
+        ), budget + 1.0)
+    except asyncio.TimeoutError:
+        deadline.skip("enrichment")
+        return data, citations, {"added_docs": 0}
     if not added_ids:
         return data, citations, {"added_docs": 0}
 
-    matches2, rows2, avg2 = retrieve_topk(
-        db, query_text=standalone, workspace=workspace, api_key=None
-    )
+    try:
+        matches2, rows2, avg2 = await aretrieve_topk(
+            db, query_text=standalone, workspace=workspace, api_key=None, q_vec=q_vec,
+            timeout=deadline.child(settings.RETRIEVAL_BUDGET_MS).remaining(),
+        )
+    except asyncio.TimeoutError:
+        deadline.skip("retrieval")
+        return data, citations, {"added_docs": len(added_ids)}
     if not rows2:
         return data, citations, {"added_docs": len(added_ids)}
-    ctx_rows2 = rows2[: settings.MAX_CONTEXT_CHUNKS]
-    context_block2, citations2 = build_context_block(ctx_rows2, db=db)
-    print("topics:", topics)
-    data2 = _call_llm_json(
-        standalone=standalone, context_block=context_block2, openai_key=openai_key
+    ctx_rows2, context_block2, citations2 = await _build_context(db, standalone, rows2, deadline)
+    data2 = await _llm_answer(
+        db=db, standalone=standalone, ctx_rows=ctx_rows2,
+        context_block=context_block2, openai_key=openai_key, deadline=deadline,
     )
     if not data2:
         data2 = {
-            "answer": extractive_answer(standalone, ctx_rows2),
+            "source": "extractive",
+            "answer": await run_in_threadpool(extractive_answer, standalone, ctx_rows2, q_vec=q_vec),
             "confidence": map_confidence(avg2, len(ctx_rows2)),
             "missing_info": data.get("missing_info", []),
             "suggested_enrichment": data.get("suggested_enrichment", []),
@@ -188,21 +413,74 @@ def _maybe_enrich_and_retry(
 
     return data2, citations2, {"added_docs": len(added_ids)}
 
+async def _background_enrich(
+    *,
+    workspace: str,
+    standalone: str,
+    query_id: UUID,
+    data: Dict[str, Any],
+    citations: List[Dict[str, Any]],
+    openai_key: str | None,
+    q_vec: List[float] | None,
+) -> Dict[str, Any]:
+    deadline = Deadline(settings.ENRICH_BACKGROUND_BUDGET_MS + settings.RETRIEVAL_BUDGET_MS + settings.LLM_BUDGET_MS)
+    async with AsyncSessionLocal() as db:
+        data2, citations2, meta = await _maybe_enrich_and_retry(
+            db=db, workspace=workspace, standalone=standalone, data=data, citations=citations,
+            openai_key=openai_key, auto_enrich_flag=True, deadline=deadline, q_vec=q_vec,
+            budget_ms=settings.ENRICH_BACKGROUND_BUDGET_MS,
+        )
+    out = _make_out(
+        query_id=str(query_id),
+        answer=data2.get("answer", ""),
+        confidence=data2.get("confidence", "medium"),
+        missing_info=data2.get("missing_info", []) or [],
+        suggested_enrichment=data2.get("suggested_enrichment", []) or [],
+        citations=citations2,
+        enrichment_meta=meta,
+        latency=deadline.report(),
+    )
+    if data2 is not data:
+        # same id: the improved answer replaces the first-pass row
+        await _record_query(query_id, workspace, standalone, out)
+    return out
+
 @router.post("/ask")
-def ask(
+async def ask(
     payload: Dict[str, Any],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     workspace: str = Depends(workspace_header),
     openai_key: str | None = Depends(openai_key_header),
 ):
     query_raw: str = (payload.get("query") or "").strip()
-    history: List[Dict[str, str]] = payload.get("history") or []
     if not query_raw:
         raise HTTPException(400, "Query is required.")
 
-    standalone = crud.create_query(db, workspace_id=workspace, question=query_raw)
-    citations, conf_str, data, avg_score = _first_pass_answer(
-        db=db, workspace=workspace, standalone=standalone, openai_key=openai_key
+    standalone = query_raw
+    deadline = Deadline.for_request(payload.get("deadline_ms"))
+    conv = _conversation(workspace, query_raw, payload)
+    query_id = query_log.new_id()
+    q_vec, hit, rows, avg_score = await _retrieve(
+        db, workspace=workspace, standalone=standalone, deadline=deadline, conversation=conv
+    )
+
+    if hit:
+        out = _make_out(
+            query_id=str(query_id),
+            answer=hit["answer"],
+            confidence=hit["confidence"],
+            missing_info=hit["missing_info"],
+            suggested_enrichment=hit["suggested_enrichment"],
+            citations=hit["citations"],
+            cached=True,
+            latency=deadline.report(),
+        )
+        await _record_query(query_id, workspace, query_raw, out)
+        return JSONResponse(out)
+
+    citations, conf_str, data, avg_score = await _first_pass_answer(
+        db=db, standalone=standalone, openai_key=openai_key, rows=rows, avg_score=avg_score,
+        deadline=deadline, q_vec=q_vec,
     )
 
     auto_enrich_requested = bool(
@@ -221,9 +499,20 @@ def ask(
         or has_missing_info
     )
 
-    if should_enrich:
-        print("Auto-enriching...", auto_enrich_requested, conf_str, avg_score, distinct_docs, has_missing_info)
-        data, citations, enrich_meta = _maybe_enrich_and_retry(
+    background = (payload.get("enrich_mode") or settings.AUTO_ENRICH_MODE) == "background"
+    if should_enrich and background:
+        first_data, first_citations = data, citations
+        ticket = enrich_jobs.submit(
+            workspace=workspace,
+            query_id=str(query_id),
+            job=lambda: _background_enrich(
+                workspace=workspace, standalone=standalone, query_id=query_id, data=first_data,
+                citations=first_citations, openai_key=openai_key, q_vec=q_vec,
+            ),
+        )
+        enrich_meta = {"mode": "background", "ticket": ticket.id, "status": ticket.status}
+    elif should_enrich:
+        data, citations, enrich_meta = await _maybe_enrich_and_retry(
             db=db,
             workspace=workspace,
             standalone=standalone,
@@ -231,19 +520,285 @@ def ask(
             citations=citations,
             openai_key=openai_key,
             auto_enrich_flag=True,
+            deadline=deadline,
+            q_vec=q_vec,
         )
     else:
         enrich_meta = None
 
     out = _make_out(
-        query_id=str(qrow.id),
+        query_id=str(query_id),
         answer=data.get("answer", ""),
         confidence=data.get("confidence", "medium"),
         missing_info=data.get("missing_info", []) or [],
         suggested_enrichment=data.get("suggested_enrichment", []) or [],
         citations=citations,
-        enrichment_meta=enrich_meta
+        enrichment_meta=enrich_meta,
+        latency=deadline.report(),
     )
 
-    _persist_query(db, qrow, out)
+    await _record_query(query_id, workspace, query_raw, out)
+    if settings.ANSWER_CACHE_ENABLED and citations and data.get("source") != "extractive" and not deadline.skipped:
+        await db.run_sync(answer_cache.store, workspace, q_vec, _cacheable(out))
     return JSONResponse(out)
+
+
+async def _ask_events(
+    *,
+    query_raw: str,
+    workspace: str,
+    openai_key: str | None,
+    deadline: Deadline,
+    conversation: str | None = None,
+) -> AsyncIterator[str]:
+    async with AsyncSessionLocal() as db:
+        try:
+            standalone = query_raw
+            query_id = query_log.new_id()
+            q_vec, hit, rows, avg_score = await _retrieve(
+                db, workspace=workspace, standalone=standalone, deadline=deadline, conversation=conversation
+            )
+
+            if hit:
+                citations, data, ctx_rows = hit["citations"], dict(hit), []
+                yield sse_event("citations", {"citations": citations, "origin": origin_summary(citations)})
+                yield sse_event("token", {"text": data["answer"]})
+            else:
+                ctx_rows, citations, context_block = [], [], ""
+                if rows:
+                    ctx_rows, context_block, citations = await _build_context(db, standalone, rows, deadline)
+                yield sse_event("citations", {"citations": citations, "origin": origin_summary(citations)})
+
+                data, cache_key = None, None
+                if not rows:
+                    data = _timed_out_data(standalone) if "retrieval" in deadline.skipped else _no_results_data(standalone)
+                elif settings.LLM_CACHE_ENABLED:
+                    cache_key = _completion_key(standalone, ctx_rows)
+                    data = await db.run_sync(llm_cache.get, cache_key)
+
+                key = openai_key or settings.OPENAI_API_KEY
+                if data is None and key:
+                    streamer, sent = JsonFieldStreamer("answer"), False
+                    first_token_timeout = deadline.child(settings.LLM_BUDGET_MS).remaining()
+                    try:
+                        if first_token_timeout <= 0:
+                            raise asyncio.TimeoutError
+                        async for delta in _stream_llm_json(
+                            standalone=standalone, context_block=context_block, openai_key=key,
+                            first_token_timeout=first_token_timeout,
+                        ):
+                            piece = streamer.feed(delta)
+                            if piece:
+                                sent = True
+                                yield sse_event("token", {"text": piece})
+                        data = json.loads(streamer.text)
+                    except (asyncio.TimeoutError, CircuitOpenError):
+                        deadline.skip("llm")
+                        data = None
+                    except Exception:
+                        data = None
+                    if data and data.get("answer") and cache_key:
+                        await db.run_sync(llm_cache.put, cache_key, data)
+                    elif data is None and sent:
+                        # the partial answer is replaced by the extractive fallback below
+                        yield sse_event("reset", {})
+                elif data is not None:
+                    yield sse_event("token", {"text": data.get("answer", "")})
+
+                if data is None:
+                    data = await run_in_threadpool(_extractive_data, standalone, ctx_rows, avg_score, q_vec)
+                    yield sse_event("token", {"text": data["answer"]})
+
+                if data.get("confidence") not in {"high", "medium", "low"}:
+                    data["confidence"] = map_confidence(avg_score, len(ctx_rows))
+
+            out = _make_out(
+                query_id=str(query_id),
+                answer=data.get("answer", ""),
+                confidence=data.get("confidence", "medium"),
+                missing_info=data.get("missing_info", []) or [],
+                suggested_enrichment=data.get("suggested_enrichment", []) or [],
+                citations=citations,
+                cached=bool(hit),
+                latency=deadline.report(),
+            )
+            await _record_query(query_id, workspace, query_raw, out)
+            if (settings.ANSWER_CACHE_ENABLED and not hit and citations
+                    and data.get("source") != "extractive" and not deadline.skipped):
+                await db.run_sync(answer_cache.store, workspace, q_vec, _cacheable(out))
+            yield sse_event("done", {
+                "query_id": out["query_id"],
+                "confidence": out["confidence"],
+                "missing_info": out["missing_info"],
+                "suggested_enrichment": out["suggested_enrichment"],
+                "cached": out["cached"],
+                "latency": out["latency"],
+            })
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+
+@router.post("/ask/stream")
+async def ask_stream(
+    payload: Dict[str, Any],
+    workspace: str = Depends(workspace_header),
+    openai_key: str | None = Depends(openai_key_header),
+):
+    """
+    Server-Sent Events variant of /ask: `citations` as soon as retrieval is
+    done, then `token` events with answer text, then `done` with confidence,
+    missing_info and the persisted query_id. A `reset` event tells the client
+    to discard streamed text that is replaced by a fallback answer.
+    Auto-enrichment is not applied.
+    """
+    query_raw: str = (payload.get("query") or "").strip()
+    if not query_raw:
+        raise HTTPException(400, "Query is required.")
+    deadline = Deadline.for_request(payload.get("deadline_ms"))
+    return sse_stream(_ask_events(
+        query_raw=query_raw, workspace=workspace, openai_key=openai_key, deadline=deadline,
+        conversation=_conversation(workspace, query_raw, payload),
+    ))
+
+
+async def _batch_retrieve(db: AsyncSession, *, workspace: str, questions: List[str]):
+    """One embed_batch call, concurrent vector queries, one chunk/reputation/doc fetch for the whole batch."""
+    q_vecs = await run_in_threadpool(embed_batch, questions, settings.EMBEDDING_MODEL)
+    sem = asyncio.Semaphore(settings.ASK_BATCH_SEARCH_CONCURRENCY)
+
+    async def _search(vec):
+        async with sem:
+            return await run_in_threadpool(vector_search, workspace, vec)
+
+    matches_list = await asyncio.gather(*(_search(v) for v in q_vecs))
+    ranked = await db.run_sync(rank_matches_batch, matches_list, workspace=workspace)
+    doc_meta = await db.run_sync(doc_meta_map, list({r.id: r for rows, _ in ranked for r in rows}.values()))
+    return q_vecs, ranked, doc_meta
+
+async def _batch_answer(
+    *, workspace: str, query_id: UUID, question: str, q_vec, rows, avg_score: float,
+    doc_meta: Dict[str, Any], openai_key: str | None, deadline_ms: Any,
+) -> Dict[str, Any]:
+    # each question gets its own session: an AsyncSession must not be shared by concurrent tasks
+    async with AsyncSessionLocal() as db:
+        deadline = Deadline.for_request(deadline_ms)
+        hit = None
+        if settings.ANSWER_CACHE_ENABLED:
+            hit = await db.run_sync(answer_cache.lookup, workspace, q_vec)
+        if hit:
+            data, citations = dict(hit), hit["citations"]
+        elif not rows:
+            data, citations = _no_results_data(question), []
+        else:
+            ctx_rows, context_block, citations = await _build_context(db, question, rows, deadline, doc_meta)
+            data = await _llm_answer(
+                db=db, standalone=question, ctx_rows=ctx_rows,
+                context_block=context_block, openai_key=openai_key, deadline=deadline,
+            )
+            if not data:
+                data = await run_in_threadpool(_extractive_data, question, ctx_rows, avg_score, q_vec)
+            if data.get("confidence") not in {"high", "medium", "low"}:
+                data["confidence"] = map_confidence(avg_score, len(ctx_rows))
+        out = _make_out(
+            query_id=str(query_id),
+            answer=data.get("answer", ""),
+            confidence=data.get("confidence", "medium"),
+            missing_info=data.get("missing_info", []) or [],
+            suggested_enrichment=data.get("suggested_enrichment", []) or [],
+            citations=citations,
+            cached=bool(hit),
+            latency=deadline.report(),
+        )
+        await _record_query(query_id, workspace, question, out)
+        if (settings.ANSWER_CACHE_ENABLED and not hit and citations
+                and data.get("source") != "extractive" and not deadline.skipped):
+            await db.run_sync(answer_cache.store, workspace, q_vec, _cacheable(out))
+        return out
+
+async def _batch_events(
+    *, questions: List[str], workspace: str, openai_key: str | None, deadline_ms: Any,
+) -> AsyncIterator[bytes]:
+    async with AsyncSessionLocal() as db:
+        try:
+            q_vecs, ranked, doc_meta = await _batch_retrieve(db, workspace=workspace, questions=questions)
+        except Exception as e:
+            yield ndjson_line({"error": str(e)})
+            return
+
+    sem = asyncio.Semaphore(settings.ASK_BATCH_LLM_CONCURRENCY)
+    query_ids = [query_log.new_id() for _ in questions]
+
+    async def _one(i: int):
+        async with sem:
+            try:
+                rows, avg_score = ranked[i]
+                out = await _batch_answer(
+                    workspace=workspace, query_id=query_ids[i], question=questions[i], q_vec=q_vecs[i],
+                    rows=rows, avg_score=avg_score, doc_meta=doc_meta,
+                    openai_key=openai_key, deadline_ms=deadline_ms,
+                )
+                return {"index": i, "question": questions[i], **out}
+            except Exception as e:
+                await _record_query(query_ids[i], workspace, questions[i], {})
+                return {"index": i, "question": questions[i], "query_id": str(query_ids[i]), "error": str(e)}
+
+    tasks = [asyncio.ensure_future(_one(i)) for i in range(len(questions))]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield ndjson_line(await fut)
+        yield ndjson_line({"done": True, "count": len(questions)})
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+@router.post("/ask/batch")
+async def ask_batch(
+    payload: Dict[str, Any],
+    workspace: str = Depends(workspace_header),
+    openai_key: str | None = Depends(openai_key_header),
+):
+    """
+    Answer many questions in one request. Questions are embedded in one batch,
+    searched concurrently and their chunks fetched once; answers are produced
+    with at most ASK_BATCH_LLM_CONCURRENCY in flight and streamed back as NDJSON
+    lines ({"index", "question", ...same fields as /ask}) in completion order,
+    ending with {"done": true}. Auto-enrichment is not applied.
+    """
+    raw = payload.get("questions")
+    if not isinstance(raw, list) or not all(isinstance(q, str) for q in raw):
+        raise HTTPException(400, "questions must be a non-empty list of non-empty strings.")
+    questions = [q.strip() for q in raw]
+    if not questions or not all(questions):
+        raise HTTPException(400, "questions must be a non-empty list of non-empty strings.")
+    if len(questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(400, f"At most {settings.ASK_BATCH_MAX_QUESTIONS} questions per batch.")
+    return ndjson_stream(_batch_events(
+        questions=questions, workspace=workspace, openai_key=openai_key, deadline_ms=payload.get("deadline_ms"),
+    ))
+
+
+@router.get("/ask/enrichment/{ticket_id}")
+async def enrichment_status(ticket_id: str, workspace: str = Depends(workspace_header)):
+    """Poll a background enrichment ticket; `result` holds the improved /ask response once done."""
+    ticket = enrich_jobs.get(ticket_id, workspace)
+    if not ticket:
+        raise HTTPException(404, "Enrichment ticket not found (expired, or issued by another worker)")
+    return ticket.view()
+
+async def _ticket_events(ticket) -> AsyncIterator[str]:
+    yield sse_event("status", {"ticket": ticket.id, "status": ticket.status})
+    while not ticket.finished.is_set():
+        try:
+            await asyncio.wait_for(ticket.finished.wait(), 15)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
+    yield sse_event("done" if ticket.status == "done" else "error", ticket.view())
+
+@router.get("/ask/enrichment/{ticket_id}/stream")
+async def enrichment_stream(ticket_id: str, workspace: str = Depends(workspace_header)):
+    """Server-Sent Events follow-up for a ticket: `status`, then `done` (or `error`) when enrichment finishes."""
+    ticket = enrich_jobs.get(ticket_id, workspace)
+    if not ticket:
+        raise HTTPException(404, "Enrichment ticket not found (expired, or issued by another worker)")
+    return sse_stream(_ticket_events(ticket))
@@ -1,16 +1,21 @@
+import base64
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query, Path, Body
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, tuple_
 from uuid import UUID
 from typing import List, Optional
 
-from app.db.session import get_db
-from app.db import models
+from app.db.session import SessionLocal, get_async_db, get_db
+from app.db import crud, models
 from app.deps import workspace_header, openai_key_header
 from app.config import settings
 from app.services.embedding import embedding_dimension
-from app.services.pinecone_client import ensure_index, get_index
-from app.services.vectorize import vectorize_and_upsert
+from app.services.pinecone_client import ensure_index
+from app.services.vectorize import clear_documents, sync_document
+from app.services.stream import ndjson_line, ndjson_stream
+from app.services import answer_cache, conversation, doc_search, reconcile, reindex
 
 router = APIRouter()
 
@@ -20,110 +25,196 @@ def _doc_or_404(db: Session, workspace: str, doc_id: UUID) -> models.Document:
         raise HTTPException(404, "Document not found")
     return doc
 
+async def _adoc_or_404(db: AsyncSession, workspace: str, doc_id: UUID) -> models.Document:
+    doc = await db.get(models.Document, doc_id)
+    if not doc or doc.workspace_id != workspace:
+        raise HTTPException(404, "Document not found")
+    return doc
+
+def _parse_ids(ids: list) -> List[UUID]:
+    try:
+        return [UUID(str(x)) for x in ids]
+    except ValueError:
+        raise HTTPException(400, "document_ids must be UUIDs")
+
+def _encode_cursor(created_at: datetime, doc_id: UUID) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{doc_id}".encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, doc_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), UUID(doc_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+def _estimate_rows(db: Session, stmt) -> int:
+    """Planner row estimate for `stmt` (EXPLAIN), no scan."""
+    compiled = stmt.compile(dialect=db.get_bind().dialect)
+    params = compiled.params
+    if compiled.positional:  # asyncpg binds $1, $2, ... by position
+        params = tuple(params[k] for k in compiled.positiontup)
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
 @router.get("/documents")
-def list_documents(
-    db: Session = Depends(get_db),
+async def list_documents(
+    db: AsyncSession = Depends(get_async_db),
     workspace: str = Depends(workspace_header),
     status: Optional[str] = Query(None, regex="^(uploaded|processed|failed)$"),
-    q: Optional[str] = Query(None, description="Search by filename (ILIKE)"),
+    q: Optional[str] = Query(None, description="Search by filename (substring, trigram-indexed)"),
+    fuzzy: bool = Query(False, description="Also match misspelled filenames, best matches first (offset pagination only)"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (keyset pagination; ignores offset)"),
+    total: str = Query("exact", regex="^(exact|approx|none)$", description="approx: planner estimate for large results"),
 ):
-    base = (
-        db.query(
-            models.Document.id,
-            models.Document.filename,
-            models.Document.status,
-            models.Document.bytes,
-            models.Document.created_at,
-            models.Document.updated_at,
-            func.count(models.Chunk.id).label("chunks"),
-        )
-        .outerjoin(models.Chunk, models.Chunk.document_id == models.Document.id)
-        .filter(models.Document.workspace_id == workspace)
-        .group_by(
-            models.Document.id,
-            models.Document.filename,
-            models.Document.status,
-            models.Document.bytes,
-            models.Document.created_at,
-            models.Document.updated_at,
-        )
-        .order_by(models.Document.created_at.desc())
-    )
+    d = models.Document
+    filters, rank = [d.workspace_id == workspace], None
     if status:
-        base = base.filter(models.Document.status == status)
+        filters.append(d.status == status)
     if q:
-        base = base.filter(models.Document.filename.ilike(f"%{q}%"))
+        match, rank = await db.run_sync(doc_search.filename_filter, q, fuzzy=fuzzy)
+        filters.append(match)
+    if cursor and rank is not None:
+        raise HTTPException(400, "cursor pagination is not available for fuzzy search")
+
+    page = (
+        select(d.id, d.filename, d.status, d.bytes, d.chunk_count, d.vector_count, d.created_at, d.updated_at)
+        .where(*filters)
+        .order_by(*([rank.desc()] if rank is not None else []), d.created_at.desc(), d.id.desc())
+        .limit(limit)
+    )
+    if cursor:
+        created_at, doc_id = _decode_cursor(cursor)
+        page = page.where(tuple_(d.created_at, d.id) < tuple_(created_at, doc_id))
+    else:
+        page = page.offset(offset)
+    rows = (await db.execute(page)).all()
+
+    count = select(func.count()).select_from(d).where(*filters)
+    estimated = False
+    if total == "none":
+        n = None
+    elif total == "approx" and (n := await db.run_sync(_estimate_rows, select(d.id).where(*filters))) >= settings.DOCUMENTS_EXACT_COUNT_BELOW:
+        estimated = True
+    else:
+        n = (await db.execute(count)).scalar() or 0
 
-    total = base.count()
-    rows = base.offset(offset).limit(limit).all()
     docs = [
         {
             "id": str(r.id),
             "filename": r.filename,
             "status": r.status,
             "bytes": r.bytes,
-            "chunks": int(r.chunks or 0),
+            "chunks": r.chunk_count,
+            "vectors": r.vector_count,
             "created_at": r.created_at,
             "updated_at": r.updated_at,
         }
         for r in rows
     ]
-    return {"total": total, "limit": limit, "offset": offset, "documents": docs}
+    return {
+        "total": n,
+        "total_is_estimate": estimated,
+        "limit": limit,
+        "offset": None if cursor else offset,
+        "next_cursor": _encode_cursor(rows[-1].created_at, rows[-1].id) if len(rows) == limit and rank is None else None,
+        "documents": docs,
+    }
+
+@router.get("/documents/autocomplete")
+async def autocomplete_documents(
+    db: AsyncSession = Depends(get_async_db),
+    workspace: str = Depends(workspace_header),
+    prefix: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+):
+    rows = await db.run_sync(doc_search.autocomplete, workspace, prefix, limit)
+    return {"prefix": prefix, "matches": [{"id": str(r.id), "filename": r.filename} for r in rows]}
 
 @router.get("/documents/{doc_id}")
-def get_document(
+async def get_document(
     doc_id: UUID = Path(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     workspace: str = Depends(workspace_header),
 ):
-    doc = _doc_or_404(db, workspace, doc_id)
-    chunk_count = db.query(func.count(models.Chunk.id)).filter(models.Chunk.document_id == doc.id).scalar() or 0
+    doc = await _adoc_or_404(db, workspace, doc_id)
     return {
         "id": str(doc.id),
         "filename": doc.filename,
         "status": doc.status,
         "bytes": doc.bytes,
-        "chunks": int(chunk_count),
+        "chunks": doc.chunk_count,
+        "vectors": doc.vector_count,
         "created_at": doc.created_at,
         "updated_at": doc.updated_at,
         "meta": doc.meta or {},
     }
 
+PREVIEW_CHARS = 200
+
+def _chunk_item(r, *, text: str | None = None, preview: str | None = None) -> dict:
+    item = {
+        "chunk_id": str(r.id),
+        "idx": r.idx,
+        "page_start": r.page_start,
+        "page_end": r.page_end,
+        "token_count": r.token_count,
+    }
+    if text is not None:
+        item["text"] = text
+    if preview is not None:
+        prev = preview.strip().replace("\n", " ")
+        item["preview"] = (prev[:PREVIEW_CHARS] + "…") if len(prev) > PREVIEW_CHARS else prev
+    return item
+
+def _export_chunks(doc_id: UUID):
+    # own session: the request's session is closed before the body is streamed
+    c, B = models.Chunk, max(1, settings.CHUNK_EXPORT_BATCH)
+    db = SessionLocal()
+    try:
+        last = -1
+        while True:
+            rows = db.execute(
+                select(c.id, c.idx, c.page_start, c.page_end, c.token_count, c.text)
+                .where(c.document_id == doc_id, c.idx > last)
+                .order_by(c.idx)
+                .limit(B)
+            ).all()
+            if not rows:
+                return
+            yield b"".join(ndjson_line(_chunk_item(r, text=r.text)) for r in rows)
+            last = rows[-1].idx
+    finally:
+        db.close()
+
 @router.get("/documents/{doc_id}/chunks")
-def list_document_chunks(
+async def list_document_chunks(
     doc_id: UUID = Path(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     workspace: str = Depends(workspace_header),
     limit: int = Query(100, ge=1, le=500),
     offset: int = Query(0, ge=0),
     include_text: bool = Query(False),
+    format: str = Query("json", regex="^(json|ndjson)$", description="ndjson: stream every chunk with its text (export)"),
 ):
-    _ = _doc_or_404(db, workspace, doc_id)
-    q = (
-        db.query(models.Chunk)
-        .filter(models.Chunk.document_id == doc_id)
-        .order_by(models.Chunk.idx)
-    )
-    total = q.count()
-    items = q.offset(offset).limit(limit).all()
-    out = []
-    for ch in items:
-        item = {
-            "chunk_id": str(ch.id),
-            "idx": ch.idx,
-            "page_start": ch.page_start,
-            "page_end": ch.page_end,
-            "token_count": ch.token_count,
-        }
-        if include_text:
-            item["text"] = ch.text
-        else:
-            prev = (ch.text or "").strip().replace("\n", " ")
-            item["preview"] = (prev[:200] + "…") if len(prev) > 200 else prev
-        out.append(item)
-    return {"total": total, "limit": limit, "offset": offset, "chunks": out}
+    doc = await _adoc_or_404(db, workspace, doc_id)
+    if format == "ndjson":
+        return ndjson_stream(_export_chunks(doc.id))
+
+    c = models.Chunk
+    # previews come from a bounded SQL substring, never the whole text column
+    body = c.text if include_text else func.substr(c.text, 1, PREVIEW_CHARS * 4)
+    rows = (await db.execute(
+        select(c.id, c.idx, c.page_start, c.page_end, c.token_count, body.label("body"))
+        .where(c.document_id == doc.id)
+        .order_by(c.idx)
+        .offset(offset)
+        .limit(limit)
+    )).all()
+    out = [_chunk_item(r, text=r.body) if include_text else _chunk_item(r, preview=r.body or "") for r in rows]
+    return {"total": doc.chunk_count, "limit": limit, "offset": offset, "chunks": out}
 
 @router.post("/documents/{doc_id}/reindex")
 def reindex_document(
@@ -131,99 +222,136 @@ def reindex_document(
     db: Session = Depends(get_db),
     workspace: str = Depends(workspace_header),
     openai_key: str | None = Depends(openai_key_header),
-    clear_first: bool = Query(False, description="Delete vectors for this doc before upsert"),
-    force: bool = Query(True, description="Re-embed even if already processed"),
+    clear_first: bool = Query(False, description="Delete all vectors for this doc and re-embed every chunk"),
+    force: bool = Query(False, description="Re-embed every chunk, even those whose vectors are up to date"),
 ):
+    """Incremental by default: only chunks that are new or changed since they were last embedded are embedded."""
     doc = _doc_or_404(db, workspace, doc_id)
     ensure_index(embedding_dimension())
-    idx = get_index()
-
-    if clear_first:
-        idx.delete(filter={"document_id": str(doc.id)}, namespace=workspace)
 
-    chunks = (
-        db.query(models.Chunk)
-        .filter(models.Chunk.document_id == doc.id)
-        .order_by(models.Chunk.idx)
-        .all()
-    )
-    if not chunks:
+    chunk_count = db.query(func.count(models.Chunk.id)).filter(models.Chunk.document_id == doc.id).scalar() or 0
+    if not chunk_count:
         raise HTTPException(400, "No chunks to index for this document.")
 
-    vectorize_and_upsert(
-        workspace=workspace,
-        document_id=str(doc.id),
-        filename=doc.filename,
-        chunks=chunks,
-        openai_key=openai_key,  # used only if provider='openai'
-    )
-    if force or doc.status != "processed":
+    if clear_first:
+        failed = clear_documents(db, workspace=workspace, document_ids=[doc.id])
+        if failed:
+            raise HTTPException(502, failed[doc.id])
+    synced = sync_document(db, workspace=workspace, document_id=doc.id, filename=doc.filename, openai_key=openai_key, force=force)
+    if doc.status != "processed":
         doc.status = "processed"
         db.add(doc); db.commit()
-    return {"id": str(doc.id), "filename": doc.filename, "status": doc.status, "chunks": len(chunks)}
+    answer_cache.invalidate_documents(workspace, [doc.id])
+    return {
+        "id": str(doc.id), "filename": doc.filename, "status": doc.status, "chunks": int(chunk_count),
+        "embedded": synced["embedded"], "moved": synced["moved"], "deleted": synced["deleted"], "unchanged": synced["unchanged"],
+    }
 
-@router.post("/reindex")
+@router.post("/reindex", status_code=202)
 def reindex_documents(
     payload: dict = Body(...),
     db: Session = Depends(get_db),
     workspace: str = Depends(workspace_header),
     openai_key: str | None = Depends(openai_key_header),
 ):
+    """Start a background reindex job; follow it with GET /reindex/jobs/{job_id}."""
     ids: List[str] = payload.get("document_ids") or []
     all_pending: bool = bool(payload.get("all_pending"))
     force: bool = bool(payload.get("force"))
     clear_first: bool = bool(payload.get("clear_first"))
+    if not ids and not all_pending:
+        raise HTTPException(400, "Provide 'document_ids' or set 'all_pending': true")
+    requested = _parse_ids(ids)
+    if reindex.active(db, workspace):
+        raise HTTPException(409, "A reindex job is already running for this workspace")
 
     ensure_index(embedding_dimension())
-    idx = get_index()
-
-    qy = db.query(models.Document).filter(models.Document.workspace_id == workspace)
-    if ids:
-        uuids = [UUID(x) for x in ids]
-        qy = qy.filter(models.Document.id.in_(uuids))
-    elif all_pending:
-        qy = qy.filter(models.Document.status.in_(["uploaded", "failed"]))
-    else:
-        raise HTTPException(400, "Provide 'document_ids' or set 'all_pending': true")
+    doc_ids = reindex.plan(db, workspace, document_ids=requested, all_pending=all_pending)
+    job = reindex.start(db, workspace=workspace, document_ids=doc_ids, force=force,
+                        clear_first=clear_first, openai_key=openai_key)
+    return reindex.view(job)
+
+def _job_or_404(db: Session, workspace: str, job_id: UUID) -> models.ReindexJob:
+    job = db.get(models.ReindexJob, job_id)
+    if not job or job.workspace_id != workspace:
+        raise HTTPException(404, "Reindex job not found")
+    return job
+
+@router.get("/reindex/jobs")
+def list_reindex_jobs(
+    db: Session = Depends(get_db),
+    workspace: str = Depends(workspace_header),
+    limit: int = Query(20, ge=1, le=100),
+):
+    jobs = (
+        db.query(models.ReindexJob)
+        .filter(models.ReindexJob.workspace_id == workspace)
+        .order_by(models.ReindexJob.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return {"jobs": [reindex.view(j) for j in jobs]}
+
+@router.get("/reindex/jobs/{job_id}")
+def get_reindex_job(
+    job_id: UUID = Path(...),
+    db: Session = Depends(get_db),
+    workspace: str = Depends(workspace_header),
+):
+    return reindex.view(_job_or_404(db, workspace, job_id))
 
-    docs = qy.order_by(models.Document.created_at.desc()).all()
-    results, updated = [], 0
-    for doc in docs:
-        try:
-            if clear_first:
-                idx.delete(filter={"document_id": str(doc.id)}, namespace=workspace)
-
-            chunks = (
-                db.query(models.Chunk)
-                .filter(models.Chunk.document_id == doc.id)
-                .order_by(models.Chunk.idx)
-                .all()
-            )
-            if not chunks:
-                results.append({"id": str(doc.id), "filename": doc.filename, "status": "no_chunks"})
-                continue
-
-            if not force and doc.status == "processed":
-                results.append({"id": str(doc.id), "filename": doc.filename, "status": "skipped_already_processed"})
-                continue
-
-            vectorize_and_upsert(
-                workspace=workspace,
-                document_id=str(doc.id),
-                filename=doc.filename,
-                chunks=chunks,
-                openai_key=openai_key,
-            )
-            doc.status = "processed"
-            db.add(doc); db.commit()
-            updated += 1
-            results.append({"id": str(doc.id), "filename": doc.filename, "status": "processed", "chunks": len(chunks)})
-        except Exception as e:
-            doc.status = "failed"
-            db.add(doc); db.commit()
-            results.append({"id": str(doc.id), "filename": doc.filename, "status": "failed", "error": str(e)})
-
-    return {"updated": updated, "results": results}
+@router.post("/reindex/jobs/{job_id}/cancel")
+def cancel_reindex_job(
+    job_id: UUID = Path(...),
+    db: Session = Depends(get_db),
+    workspace: str = Depends(workspace_header),
+):
+    return reindex.view(reindex.cancel(db, _job_or_404(db, workspace, job_id)))
+
+@router.post("/reindex/jobs/{job_id}/resume", status_code=202)
+def resume_reindex_job(
+    job_id: UUID = Path(...),
+    db: Session = Depends(get_db),
+    workspace: str = Depends(workspace_header),
+    openai_key: str | None = Depends(openai_key_header),
+):
+    job = _job_or_404(db, workspace, job_id)
+    if job.status == "done":
+        raise HTTPException(400, "Reindex job already finished")
+    if reindex.active(db, workspace):
+        raise HTTPException(409, "A reindex job is already running for this workspace")
+    ensure_index(embedding_dimension())
+    return reindex.view(reindex.resume(db, job, openai_key))
+
+@router.post("/reconcile")
+def reconcile_vectors(
+    db: Session = Depends(get_db),
+    workspace: str = Depends(workspace_header),
+    openai_key: str | None = Depends(openai_key_header),
+    dry_run: bool = Query(False, description="Only report missing and orphan vectors"),
+):
+    """Diff the namespace's vector ids against the workspace's chunks; delete orphans and embed missing chunks."""
+    if not dry_run and reindex.active(db, workspace):
+        raise HTTPException(409, "A reindex job is running for this workspace")
+    try:
+        return reconcile.run(db, workspace=workspace, openai_key=openai_key, dry_run=dry_run)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+
+@router.get("/reconcile")
+def last_reconcile(workspace: str = Depends(workspace_header)):
+    report = reconcile.last_report(workspace)
+    if report is None:
+        raise HTTPException(404, "No reconciliation has run for this workspace")
+    return report
+
+def _delete(db: Session, workspace: str, doc_ids: List[UUID], clear_vectors: bool) -> dict:
+    failed = clear_documents(db, workspace=workspace, document_ids=doc_ids) if clear_vectors else {}
+    ok = [d for d in doc_ids if d not in failed]
+    deleted = crud.delete_documents(db, ok)
+    answer_cache.invalidate_documents(workspace, ok)
+    conversation.invalidate_workspace(workspace)
+    return {"deleted": deleted, "deleted_ids": [str(d) for d in ok], "failed": {str(k): v for k, v in failed.items()}}
 
 @router.delete("/documents/{doc_id}")
 def delete_document(
@@ -233,10 +361,29 @@ def delete_document(
     clear_vectors: bool = Query(True, description="Delete Pinecone vectors for this doc"),
 ):
     doc = _doc_or_404(db, workspace, doc_id)
-
-    if clear_vectors:
-        idx = get_index()
-        idx.delete(filter={"document_id": str(doc.id)}, namespace=workspace)
-
-    db.delete(doc); db.commit()
+    res = _delete(db, workspace, [doc.id], clear_vectors)
+    if res["failed"]:
+        raise HTTPException(502, res["failed"][str(doc.id)])
     return {"id": str(doc_id), "status": "deleted", "cleared_vectors": clear_vectors}
+
+@router.post("/documents/bulk-delete")
+def delete_documents(
+    payload: dict = Body(...),
+    db: Session = Depends(get_db),
+    workspace: str = Depends(workspace_header),
+):
+    """Delete many documents: vectors by id in parallel batches, rows with set-based statements."""
+    ids: List[str] = payload.get("document_ids") or []
+    clear_vectors: bool = bool(payload.get("clear_vectors", True))
+    if not ids:
+        raise HTTPException(400, "Provide 'document_ids'")
+    if len(ids) > settings.BULK_DELETE_MAX_DOCUMENTS:
+        raise HTTPException(413, f"Too many documents. Limit is {settings.BULK_DELETE_MAX_DOCUMENTS}.")
+    requested = _parse_ids(ids)
+    d = models.Document
+    found = list(db.execute(select(d.id).where(d.workspace_id == workspace, d.id.in_(requested))).scalars())
+    res = _delete(db, workspace, found, clear_vectors)
+    hit = set(found)
+    res["not_found"] = sorted({str(u) for u in requested if u not in hit})
+    res["cleared_vectors"] = clear_vectors
+    return res
@@ -1,16 +1,17 @@
 # app/routers/feedback.py
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
-from typing import Optional, List
-from uuid import UUID
+from typing import Optional
+from uuid import UUID, uuid4
 
-from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy import cast, Float, literal
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.db import models
 from app.deps import workspace_header
+from app.services import query_log, reputation
 
 router = APIRouter()
 
@@ -22,77 +23,41 @@ class FeedbackIn(BaseModel):
 
 
 @router.post("/feedback")
-def submit_feedback(
+async def submit_feedback(
     payload: FeedbackIn,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     workspace: str = Depends(workspace_header),
 ):
-    q = db.get(models.Query, payload.query_id)
-    if not q or q.workspace_id != workspace:
+    if query_log.is_pending(payload.query_id):
+        await run_in_threadpool(query_log.flush)  # answered moments ago, row still in the write-behind buffer
+    q = await db.get(models.Query, payload.query_id)
+    if q is None:
+        # the answer may still sit in another worker's write-behind buffer: keep the vote until its row is written
+        fb_id = uuid4()
+        db.add(models.PendingFeedback(id=fb_id, query_id=payload.query_id, workspace_id=workspace,
+                                      rating=payload.rating, comment=payload.comment or None))
+        await db.commit()
+        attached = await run_in_threadpool(query_log.attach_feedback_now, payload.query_id)  # written meanwhile
+        return {"ok": True, "updated": 0, "pending": not attached, "feedback_id": str(fb_id)}
+    if q.workspace_id != workspace:
         raise HTTPException(404, "Query not found")
 
-    fb = models.Feedback(
+    chunk_ids, doc_ids = q.used_chunk_ids or [], q.used_document_ids
+    if doc_ids is None and chunk_ids:  # logged before queries carried their document ids
+        doc_ids = list((await db.execute(
+            select(models.Chunk.document_id).where(models.Chunk.id.in_(chunk_ids)).distinct()
+        )).scalars())
+
+    fb_id = uuid4()
+    db.add(models.Feedback(
+        id=fb_id,
         query_id=payload.query_id,
         rating=payload.rating,
         comment=payload.comment or None,
-    )
-    db.add(fb)
-
-    used_chunks: List[UUID] = list(set(q.used_chunk_ids or []))  # dedupe
-    if not used_chunks:
-        db.commit()
-        return {"ok": True, "updated": 0, "feedback_id": str(fb.id)}
-
-    rows = (
-        db.query(models.Chunk.document_id)
-        .filter(models.Chunk.id.in_(used_chunks))
-        .all()
-    )
-    doc_ids = list({r.document_id for r in rows})
-    if not doc_ids:
-        db.commit()
-        return {"ok": True, "updated": 0, "feedback_id": str(fb.id)}
-
-    up = 1 if payload.rating > 0 else 0
-    down = 1 if payload.rating < 0 else 0
-
-    table = models.DocumentReputation.__table__
-    values = [
-        {
-            "workspace_id": workspace,
-            "document_id": did,
-            "up_count": up,
-            "down_count": down,
-            "score": 0.0,
-        }
-        for did in doc_ids
-    ]
-
-    if up or down:
-        stmt = pg_insert(table).values(values)
-
-        new_up = table.c.up_count + stmt.excluded.up_count
-        new_down = table.c.down_count + stmt.excluded.down_count
-
-        score_expr = cast(new_up - new_down, Float) / cast(
-            new_up + new_down + literal(3), Float
-        )
-
-        stmt = stmt.on_conflict_do_update(
-            index_elements=[table.c.workspace_id, table.c.document_id],
-            set_={
-                "up_count": new_up,
-                "down_count": new_down,
-                "score": score_expr,
-            },
-        )
-
-        db.execute(stmt)
-
-    db.commit()
+    ))
+    await db.commit()
 
-    return {
-        "ok": True,
-        "updated": len(doc_ids) if (up or down) else 0,
-        "feedback_id": str(fb.id),
-    }
+    # reputation is updated in batches (app.services.reputation); record() only writes itself when batching is off
+    queued = await run_in_threadpool(reputation.record, workspace, document_ids=doc_ids or [], chunk_ids=chunk_ids,
+                                     rating=payload.rating)
+    return {"ok": True, "updated": queued, "feedback_id": str(fb_id)}
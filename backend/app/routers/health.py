@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app.db.session import get_db
+from app.services import answer_cache, conversation, enrich_jobs, llm, llm_cache, query_log, reputation, web_cache
 
 router = APIRouter()
 
@@ -9,3 +10,10 @@ router = APIRouter()
 def healthz(db: Session = Depends(get_db)):
     db.execute(text("SELECT 1"))
     return {"status": "ok"}
+
+@router.get("/metrics")
+def metrics():
+    return {"answer_cache": answer_cache.stats(), "llm_cache": llm_cache.stats(), "llm": llm.stats(),
+            "conversation_cache": conversation.stats(), "query_log": query_log.stats(),
+            "enrichment": enrich_jobs.stats(), "web_cache": web_cache.stats(),
+            "reputation": reputation.stats()}
@@ -8,13 +8,14 @@ from sqlalchemy import func
 
 from app.config import settings
 from app.db.session import get_db
-from app.db import models
+from app.db import crud, models
 from app.deps import workspace_header, openai_key_header
 from app.services.extract import extract_from_bytes
 from app.services.chunker import chunk_text
 from app.services.embedding import embedding_dimension
 from app.services.pinecone_client import ensure_index
-from app.services.vectorize import vectorize_and_upsert
+from app.services.vectorize import sync_document
+from app.services import answer_cache, conversation
 from app.utils.files import ensure_dir, sha256_bytes
 
 router = APIRouter()
@@ -75,13 +76,10 @@ async def upload_files(
             )
             if existing:
                 if mode == "reindex":
-                    chunks = (
-                        db.query(models.Chunk)
-                          .filter(models.Chunk.document_id == existing.id)
-                          .order_by(models.Chunk.idx)
-                          .all()
-                    )
-                    if not chunks:
+                    chunk_count = db.query(func.count(models.Chunk.id)) \
+                                    .filter(models.Chunk.document_id == existing.id) \
+                                    .scalar() or 0
+                    if not chunk_count:
                         results.append({
                             "id": str(existing.id),
                             "filename": existing.filename,
@@ -91,11 +89,11 @@ async def upload_files(
                         continue
 
                     if can_vectorize:
-                        written = vectorize_and_upsert(
+                        synced = sync_document(
+                            db,
                             workspace=workspace,
-                            document_id=str(existing.id),
+                            document_id=existing.id,
                             filename=existing.filename,
-                            chunks=chunks,
                             openai_key=openai_key,  # only used when provider='openai'
                         )
                         existing.status = "processed"
@@ -104,8 +102,9 @@ async def upload_files(
                             "id": str(existing.id),
                             "filename": existing.filename,
                             "status": "reindexed",
-                            "chunks": len(chunks),
-                            "vectors": written,
+                            "chunks": int(chunk_count),
+                            "vectors": synced["embedded"],
+                            "unchanged": synced["unchanged"],
                             "duplicate_of": str(existing.id)
                         })
                     else:
@@ -128,19 +127,38 @@ async def upload_files(
                     })
                 continue
 
+        # reindex mode: a changed file under a known name updates that document in place
+        previous = None
+        if mode == "reindex":
+            previous = (
+                db.query(models.Document)
+                  .filter(models.Document.workspace_id == workspace,
+                          models.Document.filename == f.filename)
+                  .order_by(models.Document.created_at.desc())
+                  .first()
+            )
+
         dest_path = workspace_dir / f.filename
         dest_path.write_bytes(content)
 
-        doc = models.Document(
-            workspace_id=workspace,
-            filename=f.filename,
-            mime=f.content_type or "application/octet-stream",
-            bytes=len(content),
-            storage_uri=str(dest_path),
-            file_sha256=file_hash,
-            status="uploaded",
-            meta={}
-        )
+        if previous:
+            doc = previous
+            doc.mime = f.content_type or doc.mime
+            doc.bytes = len(content)
+            doc.storage_uri = str(dest_path)
+            doc.file_sha256 = file_hash
+            doc.status = "uploaded"
+        else:
+            doc = models.Document(
+                workspace_id=workspace,
+                filename=f.filename,
+                mime=f.content_type or "application/octet-stream",
+                bytes=len(content),
+                storage_uri=str(dest_path),
+                file_sha256=file_hash,
+                status="uploaded",
+                meta={}
+            )
         db.add(doc); db.commit(); db.refresh(doc)
 
         try:
@@ -152,27 +170,31 @@ async def upload_files(
                 overlap_tokens=settings.CHUNK_OVERLAP_TOKENS
             )
 
-            chunk_rows: list[models.Chunk] = []
-            for i, p in enumerate(parts):
-                chunk_rows.append(models.Chunk(
-                    document_id=doc.id,
-                    idx=i,
-                    text=p["text"],
-                    token_count=p["token_count"],
-                    sha256=p["sha256"],
-                    page_start=None,
-                    page_end=None,
-                ))
-            db.add_all(chunk_rows); db.commit()
+            if previous:
+                chunk_rows = crud.replace_chunks(db, doc.id, parts)
+            else:
+                chunk_rows: list[models.Chunk] = []
+                for i, p in enumerate(parts):
+                    chunk_rows.append(models.Chunk(
+                        document_id=doc.id,
+                        idx=i,
+                        text=p["text"],
+                        token_count=p["token_count"],
+                        sha256=p["sha256"],
+                        page_start=None,
+                        page_end=None,
+                    ))
+                doc.chunk_count = len(chunk_rows)
+                db.add_all(chunk_rows); db.commit()
 
             total_chunks += len(chunk_rows)
 
             if can_vectorize:
-                written = vectorize_and_upsert(
+                synced = sync_document(
+                    db,
                     workspace=workspace,
-                    document_id=str(doc.id),
+                    document_id=doc.id,
                     filename=doc.filename,
-                    chunks=chunk_rows,
                     openai_key=openai_key,
                 )
                 doc.status = "processed"
@@ -181,8 +203,9 @@ async def upload_files(
                     "id": str(doc.id),
                     "filename": doc.filename,
                     "chunks": len(chunk_rows),
-                    "vectors": written,
-                    "status": doc.status
+                    "vectors": synced["embedded"],
+                    "status": "updated" if previous else doc.status,
+                    **({"unchanged": synced["unchanged"], "deleted": synced["deleted"]} if previous else {}),
                 })
             else:
                 results.append({
@@ -203,6 +226,10 @@ async def upload_files(
                 "error": str(e)
             })
 
+    if any(r.get("status") in ("processed", "reindexed", "updated") for r in results):
+        answer_cache.invalidate_workspace(workspace)
+        conversation.invalidate_workspace(workspace)
+
     return {
         "documents": results,
         "total_chunks": total_chunks,
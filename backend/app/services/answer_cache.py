@@ -0,0 +1,108 @@
+import threading, time
+from dataclasses import dataclass
+from typing import Any, Dict, List
+import numpy as np
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import models
+
+@dataclass
+class _Entry:
+    vec: np.ndarray
+    payload: Dict[str, Any]          # answer, confidence, missing_info, suggested_enrichment, citations
+    doc_versions: Dict[str, Any]     # document_id -> updated_at when the answer was produced
+    created: float
+
+class _Workspace:
+    def __init__(self):
+        self.entries: List[_Entry] = []
+        self.matrix: np.ndarray | None = None
+
+    def drop(self, keep) -> int:
+        before = len(self.entries)
+        self.entries = [e for e in self.entries if keep(e)]
+        self.matrix = None
+        return before - len(self.entries)
+
+_lock = threading.Lock()
+_spaces: Dict[str, _Workspace] = {}
+_stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "invalidated": 0}
+
+def _unit(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    return v / (np.linalg.norm(v) + 1e-12)
+
+def _doc_versions(db: Session, doc_ids) -> Dict[str, Any]:
+    if not doc_ids: return {}
+    pairs = (
+        db.query(models.Document.id, models.Document.updated_at)
+          .filter(models.Document.id.in_(list(doc_ids)), models.Document.status == "processed")
+          .all()
+    )
+    return {str(did): ts for did, ts in pairs}
+
+def lookup(db: Session, workspace: str, query_vec) -> Dict[str, Any] | None:
+    """
+    Return the cached answer payload for the most similar earlier question in
+    this workspace, if it is above ANSWER_CACHE_MIN_SIM, younger than the TTL,
+    and none of its cited documents changed or disappeared since.
+    """
+    q = _unit(query_vec)
+    now = time.time()
+    with _lock:
+        ws = _spaces.get(workspace)
+        if ws:
+            ws.drop(lambda e: now - e.created <= settings.ANSWER_CACHE_TTL_S)
+        if not ws or not ws.entries:
+            _stats["misses"] += 1
+            return None
+        if ws.matrix is None:
+            ws.matrix = np.stack([e.vec for e in ws.entries])
+        sims = ws.matrix @ q
+        best = int(np.argmax(sims))
+        entry = ws.entries[best]
+        if float(sims[best]) < settings.ANSWER_CACHE_MIN_SIM:
+            _stats["misses"] += 1
+            return None
+
+    if _doc_versions(db, entry.doc_versions.keys()) != entry.doc_versions:
+        with _lock:
+            ws.drop(lambda e: e is not entry)
+            _stats["stale"] += 1; _stats["misses"] += 1
+        return None
+
+    with _lock:
+        _stats["hits"] += 1
+    return dict(entry.payload, similarity=float(sims[best]))
+
+def store(db: Session, workspace: str, query_vec, payload: Dict[str, Any]) -> None:
+    doc_ids = {c["document_id"] for c in payload.get("citations", []) if c.get("document_id")}
+    entry = _Entry(vec=_unit(query_vec), payload=payload, doc_versions=_doc_versions(db, doc_ids), created=time.time())
+    with _lock:
+        ws = _spaces.setdefault(workspace, _Workspace())
+        ws.entries.append(entry)
+        if len(ws.entries) > settings.ANSWER_CACHE_MAX_ENTRIES:
+            ws.entries = ws.entries[-settings.ANSWER_CACHE_MAX_ENTRIES:]
+        ws.matrix = None
+        _stats["stores"] += 1
+
+def invalidate_workspace(workspace: str) -> None:
+    with _lock:
+        ws = _spaces.pop(workspace, None)
+        if ws: _stats["invalidated"] += len(ws.entries)
+
+def invalidate_documents(workspace: str, doc_ids) -> None:
+    ids = {str(d) for d in doc_ids}
+    with _lock:
+        ws = _spaces.get(workspace)
+        if ws:
+            _stats["invalidated"] += ws.drop(lambda e: not (ids & e.doc_versions.keys()))
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_stats)
+        out["entries"] = sum(len(ws.entries) for ws in _spaces.values())
+        out["workspaces"] = len(_spaces)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+    return out
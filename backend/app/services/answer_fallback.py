@@ -1,31 +1,80 @@
-import re
-from typing import List
+import logging
+from typing import List, Sequence
+import numpy as np
+from app.config import settings
 from app.db.models import Chunk
+from app.services.sentences import chunk_sentences, embed_sentences, terms
 
-def _sentences(text: str) -> List[str]:
-    parts = re.split(r'(?<=[.!?])\s+|\n+', text.strip())
-    return [p.strip() for p in parts if p.strip()]
+log = logging.getLogger(__name__)
 
-def extractive_answer(query: str, ctx_rows: List[Chunk], max_chars: int = 1200) -> str:
+_K1, _B = 1.2, 0.75
+
+def _bm25(q_terms: List[str], tfs: Sequence, lens: np.ndarray) -> np.ndarray:
+    """BM25 of every candidate sentence (as its own document) against the query terms."""
+    vocab = list(dict.fromkeys(q_terms))
+    tf = np.array([[c.get(t, 0) for t in vocab] for c in tfs], dtype=np.float32).reshape(len(tfs), len(vocab))
+    n = len(tfs)
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+    norm = _K1 * (1 - _B + _B * lens / max(float(lens.mean()), 1.0))
+    return ((tf * (_K1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+def extractive_answer(query: str, ctx_rows: List[Chunk], max_chars: int = 1200, q_vec: List[float] | None = None) -> str:
     """
-    Cheap, deterministic fallback: take top context chunks and return
-    their most informative first sentences until we hit max_chars.
+    Cheap, deterministic fallback: score every sentence of the context chunks
+    against the query (BM25 blended with embedding similarity, in one batch),
+    then take the best ones, skipping near-duplicates, until we hit max_chars.
+    Splits and sentence embeddings are cached per chunk, so repeat calls over
+    the same chunks only embed the query (or nothing, given `q_vec`).
     """
-    out: List[str] = []
+    entries = chunk_sentences(ctx_rows)
+    cands = [(ci, si) for ci, e in enumerate(entries) for si in range(len(e.sents))]
+    if not cands:
+        return "No relevant snippets found in your uploaded documents."
+
+    tfs = [entries[ci].tf[si] for ci, si in cands]
+    lens = np.concatenate([e.lens for e in entries])
+    lex = _bm25(terms(query), tfs, lens) if terms(query) else np.zeros(len(cands), dtype=np.float32)
+    if lex.max() > 0:
+        lex = lex / lex.max()
+
+    vecs = None
+    try:
+        if q_vec is None:
+            q = embed_sentences(entries, [query])[0]
+        else:
+            embed_sentences(entries)
+            q = np.asarray(q_vec, dtype=np.float32)
+            q /= np.linalg.norm(q) + 1e-12
+        vecs = np.concatenate([e.vecs for e in entries if e.sents])
+        sem = np.clip(vecs @ q, 0.0, 1.0)
+        w = settings.EXTRACTIVE_SEMANTIC_WEIGHT
+        scores = w * sem + (1 - w) * lex
+    except Exception:
+        log.warning("sentence embedding failed; extractive answer uses term scores only", exc_info=True)
+        scores = lex
+    # ties (e.g. no overlap at all) go to earlier chunks / earlier sentences
+    order = np.lexsort((np.arange(len(cands)), -scores))
+
+    picked: List[int] = []
     remaining = max_chars
-    for ch in ctx_rows:
-        sents = _sentences(ch.text)
-        if not sents:
+    floor = float(scores[order[0]]) * settings.EXTRACTIVE_MIN_RELATIVE_SCORE
+    for i in order:
+        if picked and scores[i] < floor:
+            break
+        sent = entries[cands[i][0]].sents[cands[i][1]]
+        if len(sent) > remaining and picked:
             continue
-        # prefer first sentence; you can add naive keyword scoring here
-        pick = sents[0]
-        if len(pick) > remaining:
-            pick = pick[:remaining]
-        out.append(pick)
-        remaining -= len(pick) + 1
+        if vecs is not None and picked and float((vecs[picked] @ vecs[i]).max()) >= settings.EXTRACTIVE_MAX_SIMILARITY:
+            continue
+        picked.append(int(i))
+        remaining -= min(len(sent), remaining) + 1
         if remaining <= 0:
             break
-    if not out:
-        return "No relevant snippets found in your uploaded documents."
 
-    return "Extractive answer (no LLM due to quota):\n\n" + "\n\n".join(out)
+    # document order reads better than score order; one paragraph per chunk
+    paras: dict = {}
+    for i in sorted(picked):
+        ci, si = cands[i]
+        paras.setdefault(ci, []).append(entries[ci].sents[si][:max_chars])
+    return "Extractive answer (no LLM due to quota):\n\n" + "\n\n".join(" ".join(p) for p in paras.values())
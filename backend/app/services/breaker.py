@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker. Trips to open when, over the last `window`
+    calls (at least `min_calls`), the error rate or the share of calls slower
+    than `slow_s` reaches its threshold. After `open_s` it lets up to
+    `half_open_probes` calls through; a fast success closes it again, any
+    failure reopens it.
+
+        probe = breaker.acquire()          # raises CircuitOpenError while open
+        breaker.record(ok, latency_s, probe=probe)   # or breaker.release(probe)
+    """
+    def __init__(self, name: str, *, window: int, min_calls: int, error_rate: float,
+                 slow_s: float, slow_rate: float, open_s: float, half_open_probes: int = 1):
+        self.name = name
+        self.min_calls, self.error_rate = min_calls, error_rate
+        self.slow_s, self.slow_rate = slow_s, slow_rate
+        self.open_s, self.half_open_probes = open_s, half_open_probes
+        self._lock = threading.Lock()
+        self._calls: deque = deque(maxlen=window)  # (ok, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._counters = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0, "slow": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_s:
+            self._state, self._probes = HALF_OPEN, 0
+
+    def _open(self) -> None:
+        self._state, self._opened_at, self._probes = OPEN, time.monotonic(), 0
+        self._counters["opened"] += 1
+
+    def acquire(self) -> bool:
+        """Admit a call; returns True when it is a half-open probe."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self._counters["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def release(self, probe: bool) -> None:
+        """Give back an admitted call that ended without a verdict (e.g. cancelled)."""
+        if probe:
+            with self._lock:
+                self._probes = max(0, self._probes - 1)
+
+    def record(self, ok: bool, latency_s: float | None = None, *, probe: bool = False) -> None:
+        slow = ok and latency_s is not None and latency_s >= self.slow_s
+        with self._lock:
+            self._counters["successes" if ok else "failures"] += 1
+            if slow:
+                self._counters["slow"] += 1
+            if probe:
+                self._probes = max(0, self._probes - 1)
+                if self._state == HALF_OPEN:
+                    if ok and not slow:
+                        self._state = CLOSED
+                        self._calls.clear()
+                    else:
+                        self._open()
+                return
+            if self._state != CLOSED:
+                return
+            self._calls.append((ok, slow))
+            n = len(self._calls)
+            if n < self.min_calls:
+                return
+            errors = sum(1 for o, _ in self._calls if not o)
+            slows = sum(1 for _, s in self._calls if s)
+            if errors / n >= self.error_rate or slows / n >= self.slow_rate:
+                self._open()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            n = len(self._calls)
+            return {
+                "state": self._state,
+                "window_calls": n,
+                "window_error_rate": round(sum(1 for o, _ in self._calls if not o) / n, 4) if n else 0.0,
+                "window_slow_rate": round(sum(1 for _, s in self._calls if s) / n, 4) if n else 0.0,
+                **self._counters,
+            }
@@ -0,0 +1,25 @@
+from typing import Dict, List
+import numpy as np
+from app.config import settings
+from app.services.sentences import chunk_sentences, embed_sentences
+
+def compress_rows(query: str, rows: List, *, max_sentences: int | None = None, api_key: str | None = None) -> Dict[str, str]:
+    """
+    Query-focused compression: score every sentence of the context chunks against
+    the query in one embedding batch and keep the best `max_sentences` per chunk,
+    in their original order. Returns {chunk_id: compressed_text}; chunks that are
+    already short enough are left out so callers fall back to the full text.
+    Sentence embeddings are cached per chunk (see sentences.chunk_sentences).
+    """
+    k = max(1, int(max_sentences or settings.COMPRESS_MAX_SENTENCES))
+    todo = [(str(r.id), e) for r, e in zip(rows, chunk_sentences(rows)) if len(e.sents) > k]
+    if not todo: return {}
+
+    q = embed_sentences([e for _, e in todo], [query], api_key=api_key)[0]
+
+    out: Dict[str, str] = {}
+    for cid, e in todo:
+        s = e.vecs @ q
+        keep = np.sort(np.argpartition(-s, k - 1)[:k])
+        out[cid] = " ".join(e.sents[i] for i in keep)
+    return out
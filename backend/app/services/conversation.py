@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from app.config import settings
+
+class _Pool:
+    """Candidates retrieved over the turns of one conversation: match metadata plus unit-norm vectors."""
+    __slots__ = ("workspace", "ids", "metas", "matrix", "touched")
+
+    def __init__(self, workspace: str):
+        self.workspace = workspace
+        self.ids: List[str] = []
+        self.metas: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.touched = time.time()
+
+_lock = threading.Lock()
+_pools: "OrderedDict[str, _Pool]" = OrderedDict()
+_stats = {"reused": 0, "searched": 0, "invalidated": 0}
+
+def conversation_key(workspace: str, question: str, history: List[Dict[str, str]] | None = None,
+                     conversation_id: str | None = None) -> str:
+    """
+    Explicit conversation_id if the client sends one, else the conversation's
+    opening question: the first user turn in `history`, or this question when
+    there is no history yet (so the next turn finds the pool it left).
+    """
+    if conversation_id:
+        opener = f"id:{conversation_id}"
+    else:
+        firsts = [h.get("content") for h in (history or []) if isinstance(h, dict) and h.get("role") == "user"]
+        opener = f"q:{(firsts[0] if firsts and firsts[0] else question).strip()}"
+    return workspace + ":" + hashlib.sha256(opener.encode("utf-8")).hexdigest()
+
+def _field(m, name):
+    return m.get(name) if isinstance(m, dict) else getattr(m, name, None)
+
+def reuse(key: str, q_vec, topk: int) -> List[Dict[str, Any]] | None:
+    """
+    Matches re-scored locally from the conversation's pool, or None when the
+    pool is missing/expired or its best candidate is below CONVERSATION_REUSE_MIN_SIM
+    (the follow-up moved on; go back to the vector store).
+    """
+    q = np.asarray(q_vec, dtype=np.float32)
+    q /= np.linalg.norm(q) + 1e-12
+    now = time.time()
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None or now - pool.touched > settings.CONVERSATION_CACHE_TTL_S or not pool.ids:
+            _stats["searched"] += 1
+            return None
+        sims = pool.matrix @ q
+        if float(sims.max()) < settings.CONVERSATION_REUSE_MIN_SIM:
+            _stats["searched"] += 1
+            return None
+        pool.touched = now
+        _pools.move_to_end(key)
+        _stats["reused"] += 1
+        top = np.argsort(-sims)[:topk]
+        return [{"id": pool.ids[i], "score": float(sims[i]), "metadata": pool.metas[i]} for i in top]
+
+def remember(key: str, workspace: str, matches: list) -> None:
+    """Add freshly searched matches (queried with include_values) to the conversation's pool."""
+    fresh: List[Tuple[str, Dict[str, Any], np.ndarray]] = []
+    for m in matches:
+        vals, meta = _field(m, "values"), _field(m, "metadata")
+        if vals and meta:
+            v = np.asarray(vals, dtype=np.float32)
+            fresh.append((_field(m, "id"), dict(meta), v / (np.linalg.norm(v) + 1e-12)))
+    if not fresh:
+        return
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None or time.time() - pool.touched > settings.CONVERSATION_CACHE_TTL_S:
+            pool = _pools[key] = _Pool(workspace)
+        have = set(pool.ids)
+        new = [f for f in fresh if f[0] not in have]
+        if new:
+            rows = [pool.matrix] if pool.ids else []
+            pool.matrix = np.vstack(rows + [np.stack([v for _, _, v in new])])
+            pool.ids += [i for i, _, _ in new]
+            pool.metas += [m for _, m, _ in new]
+            # most recent candidates win when the pool outgrows its cap
+            cap = settings.CONVERSATION_POOL_MAX
+            if len(pool.ids) > cap:
+                pool.ids, pool.metas, pool.matrix = pool.ids[-cap:], pool.metas[-cap:], pool.matrix[-cap:]
+        pool.touched = time.time()
+        _pools.move_to_end(key)
+        while len(_pools) > settings.CONVERSATION_CACHE_MAX_SESSIONS:
+            _pools.popitem(last=False)
+
+def invalidate_workspace(workspace: str) -> None:
+    """New content was indexed: pools would not see it, so drop them."""
+    with _lock:
+        for k in [k for k, p in _pools.items() if p.workspace == workspace]:
+            del _pools[k]
+            _stats["invalidated"] += 1
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        total = _stats["reused"] + _stats["searched"]
+        return {**_stats, "sessions": len(_pools), "reuse_rate": round(_stats["reused"] / total, 4) if total else 0.0}
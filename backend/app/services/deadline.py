@@ -0,0 +1,42 @@
+import time
+from typing import Any, Dict, List
+from app.config import settings
+
+class Deadline:
+    """
+    Latency budget for one request. Stages take a child deadline capped by
+    their own budget, and record themselves in `skipped` when they had to be
+    dropped or cut short, so the response can say how it was degraded.
+    """
+    def __init__(self, total_ms: float, *, _end: float | None = None, _skipped: List[str] | None = None):
+        self.total_ms = float(total_ms)
+        self._start = time.monotonic()
+        self._end = _end if _end is not None else self._start + self.total_ms / 1000.0
+        self.skipped: List[str] = _skipped if _skipped is not None else []
+
+    @classmethod
+    def for_request(cls, requested_ms: Any = None) -> "Deadline":
+        try:
+            ms = float(requested_ms) if requested_ms else float(settings.ASK_DEADLINE_MS)
+        except (TypeError, ValueError):
+            ms = float(settings.ASK_DEADLINE_MS)
+        return cls(max(100.0, min(ms, float(settings.ASK_DEADLINE_MAX_MS))))
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)."""
+        return max(0.0, self._end - time.monotonic())
+
+    def child(self, stage_ms: float) -> "Deadline":
+        end = min(self._end, time.monotonic() + stage_ms / 1000.0)
+        return Deadline(stage_ms, _end=end, _skipped=self.skipped)
+
+    def skip(self, stage: str) -> None:
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "deadline_ms": self.total_ms,
+            "elapsed_ms": round((time.monotonic() - self._start) * 1000, 1),
+            "skipped": list(self.skipped),
+        }
@@ -0,0 +1,49 @@
+import logging
+from typing import Any, Tuple
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import models
+
+log = logging.getLogger(__name__)
+
+# Filename search for the documents listing. With pg_trgm installed the
+# ix_documents_filename_trgm GIN index serves substring / prefix ILIKE and the
+# fuzzy %> operator; without it everything degrades to plain ILIKE.
+
+_trgm: bool | None = None
+
+def trgm_available(db: Session) -> bool:
+    global _trgm
+    if _trgm is None:
+        _trgm = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+        if not _trgm:
+            log.warning("pg_trgm not installed; filename search falls back to unindexed ILIKE")
+    return _trgm
+
+def like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def filename_filter(db: Session, q: str, *, fuzzy: bool = False) -> Tuple[Any, Any]:
+    """(where clause, rank expression or None) for a filename query."""
+    d = models.Document
+    contains = d.filename.ilike(f"%{like_escape(q)}%", escape="\\")
+    if not fuzzy or not trgm_available(db):
+        return contains, None
+    # word_similarity threshold for %> only applies to this transaction
+    db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(settings.DOCUMENTS_FUZZY_THRESHOLD), True)))
+    return or_(contains, d.filename.op("%>")(q)), func.word_similarity(q, d.filename)
+
+def autocomplete(db: Session, workspace: str, prefix: str, limit: int) -> list:
+    """Filenames starting with `prefix` (case-insensitive), closest first."""
+    d = models.Document
+    stmt = (
+        select(d.id, d.filename)
+        .where(d.workspace_id == workspace, d.filename.ilike(f"{like_escape(prefix)}%", escape="\\"))
+        .limit(limit)
+    )
+    if trgm_available(db):
+        stmt = stmt.order_by(func.similarity(d.filename, prefix).desc(), func.length(d.filename), d.filename)
+    else:
+        stmt = stmt.order_by(func.length(d.filename), d.filename)
+    return db.execute(stmt).all()
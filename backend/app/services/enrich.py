@@ -1,41 +1,21 @@
-import hashlib, time, requests
+import asyncio, hashlib
 from typing import List, Optional
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.db import models
+from app.db.session import AsyncSessionLocal, SessionLocal
 from app.utils.files import sha256_bytes
-from app.services.vectorize import vectorize_and_upsert
+from app.services.vectorize import sync_document
 from app.services.chunker import chunk_text
+from app.services import answer_cache, conversation, webfetch
 from app.config import settings
 from urllib.parse import urlparse
 
 def _hash_text(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def _google_cse_search(topic: str) -> List[dict]:
-    if not settings.GOOGLE_CSE_API_KEY or not settings.GOOGLE_CSE_CX:
-        return []
-    params = {"key": settings.GOOGLE_CSE_API_KEY, "cx": settings.GOOGLE_CSE_CX, "q": topic, "num": 3}
-    r = requests.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    items = data.get("items", []) or []
-    out = []
-    for it in items:
-        out.append({"title": it.get("title"), "url": it.get("link")})
-    return out
-
-def _fetch_url_text(url: str) -> Optional[str]:
-    try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        txt = r.text
-        import re
-        text = re.sub(r"<[^>]+>", " ", txt)
-        text = " ".join(text.split())
-        return text if len(text) > 500 else None
-    except Exception:
-        return None
-
 def _ingest_text_as_document(
     *,
     db: Session,
@@ -85,44 +65,122 @@ def _ingest_text_as_document(
             sha256=_hash_text(p["text"]),
             page_start=None, page_end=None
         ))
+    doc.chunk_count = len(chunk_rows)
     db.add_all(chunk_rows); db.commit()
 
-    vectorize_and_upsert(
+    sync_document(
+        db,
         workspace=workspace,
-        document_id=str(doc.id),
+        document_id=doc.id,
         filename=doc.filename,
-        chunks=chunk_rows,
         openai_key=openai_key
     )
     doc.status = "processed"
     db.add(doc); db.commit()
+    answer_cache.invalidate_workspace(workspace)
+    conversation.invalidate_workspace(workspace)
     return doc
 
-def auto_enrich(
+def _ingest_sync(*, workspace: str, title: str, url: str, text: str, openai_key: str | None) -> Optional[str]:
+    # chunking, embedding and the vector upsert are blocking: one worker thread and session per page
+    db = SessionLocal()
+    try:
+        doc = _ingest_text_as_document(db=db, workspace=workspace, title=title, url=url, text=text, openai_key=openai_key)
+        return str(doc.id) if doc else None
+    finally:
+        db.close()
+
+async def _ingested_urls(workspace: str, urls: List[str]) -> set:
+    if not urls:
+        return set()
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(models.Document.storage_uri)
+            .where(models.Document.workspace_id == workspace, models.Document.storage_uri.in_(set(urls)))
+        )
+        return set(rows.scalars())
+
+class DocQuota:
+    """Documents one request may still ingest, shared by the auto_enrich calls it starts (one event loop, no lock)."""
+    def __init__(self, n: int):
+        self.left = n
+
+    def take(self) -> bool:
+        if self.left <= 0:
+            return False
+        self.left -= 1
+        return True
+
+async def auto_enrich(
     *,
-    db: Session,
     workspace: str,
     topics: List[str],
     openai_key: str | None,
     max_docs: int,
-    max_per_topic: int
+    max_per_topic: int,
+    time_budget_s: float | None = None,
+    quota: DocQuota | None = None,
 ) -> List[str]:
-    added: List[str] = []
-    budget = max_docs
-    for topic in topics:
-        if budget <= 0:
-            break
-        per_topic = 0
-        for it in _google_cse_search(topic):
-            if budget <= 0 or per_topic >= max_per_topic:
-                break
-            txt = _fetch_url_text(it["url"])
-            if not txt: continue
-            doc = _ingest_text_as_document(
-                db=db, workspace=workspace,
-                title=it["title"], url=it["url"], text=txt, openai_key=openai_key
+    """
+    Search all topics concurrently, fetch every candidate page in parallel
+    (pooled connections, per-domain limits, size-capped streaming reads) and
+    ingest pages as soon as they arrive, in arrival order, until max_docs /
+    max_per_topic are filled or the time budget runs out. Returns the ids of
+    documents ingested within the budget; ingestion that is already running
+    when it expires still completes in the background. A shared `quota` caps
+    the documents ingested across several concurrent calls.
+    """
+    loop = asyncio.get_running_loop()
+    end = loop.time() + (settings.ENRICH_FETCH_TIMEOUT_S * 2 if time_budget_s is None else time_budget_s)
+    def _left() -> float:
+        return min(settings.ENRICH_FETCH_TIMEOUT_S, end - loop.time())
+
+    async def _search(topic: str):
+        try:
+            return topic, await webfetch.cse_search(topic, timeout=max(0.1, _left()))
+        except (httpx.HTTPError, ValueError):
+            return topic, []
+
+    try:
+        searched = await asyncio.wait_for(asyncio.gather(*(_search(t) for t in topics)), max(0.1, end - loop.time()))
+    except asyncio.TimeoutError:
+        return []
+
+    # pages this workspace already ingested are not fetched again
+    seen, fetches = await _ingested_urls(workspace, [it["url"] for _, results in searched for it in results]), {}
+    for topic, results in searched:
+        for it in results:
+            if it["url"] in seen: continue
+            seen.add(it["url"])
+            fut = asyncio.ensure_future(webfetch.fetch_text(it["url"], timeout=max(0.1, _left())))
+            fetches[fut] = (topic, it)
+
+    ingest_sem = asyncio.Semaphore(settings.ENRICH_INGEST_CONCURRENCY)
+    async def _ingest(it, text):
+        async with ingest_sem:
+            return await run_in_threadpool(
+                _ingest_sync, workspace=workspace, title=it["title"], url=it["url"], text=text, openai_key=openai_key
             )
-            if doc:
-                added.append(str(doc.id)); budget -= 1; per_topic += 1
 
-    return added
+    ingests, per_topic = [], {}
+    pending = set(fetches)
+    try:
+        while pending and len(ingests) < max_docs and (quota is None or quota.left > 0) and end - loop.time() > 0:
+            done, pending = await asyncio.wait(pending, timeout=end - loop.time(), return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                topic, it = fetches[fut]
+                text = fut.result()
+                if not text or len(ingests) >= max_docs or per_topic.get(topic, 0) >= max_per_topic:
+                    continue
+                if quota is not None and not quota.take():
+                    continue
+                per_topic[topic] = per_topic.get(topic, 0) + 1
+                ingests.append(asyncio.ensure_future(_ingest(it, text)))
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+    if not ingests:
+        return []
+    done, _ = await asyncio.wait(ingests, timeout=max(0.0, end - loop.time()))
+    return [f.result() for f in ingests if f in done and not f.exception() and f.result()]
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from app.config import settings
+from app.services.enrich import DocQuota, auto_enrich
+
+log = logging.getLogger(__name__)
+
+# Enrichment shared across requests of this process: identical topics in a
+# workspace that are being enriched right now are fetched once, and background
+# enrichment runs as tickets that clients poll or stream. Tickets live in memory
+# of the worker that issued them for ENRICH_TICKET_TTL_S: with several workers,
+# AUTO_ENRICH_MODE=background needs sticky routing (or a single worker) so the
+# ticket endpoints reach that worker.
+
+DEDUPE_SLACK_S = 1.0   # join work in flight only if it runs at least this close to our own deadline
+
+_inflight: Dict[Tuple[str, str], Tuple[asyncio.Task, float]] = {}   # -> (task, monotonic deadline)
+_stats = {"topics_started": 0, "topics_deduped": 0, "tickets": 0, "done": 0, "failed": 0}
+
+def _topic_key(topic: str) -> str:
+    return " ".join(topic.lower().split())
+
+async def enrich_topics(*, workspace: str, topics: List[str], openai_key: str | None, time_budget_s: float) -> List[str]:
+    """
+    auto_enrich per topic, joining an identical topic already in flight for the
+    workspace instead of searching and fetching it again. Work in flight is
+    only joined if its budget reaches about as far as this caller's, and the
+    caller never waits past its own `time_budget_s`. The topics this call
+    starts share one AUTO_ENRICH_MAX_DOCS quota, so topics that find nothing
+    leave it to the others. A caller that gives up (timeout, cancel) does not
+    cancel work other callers are waiting on.
+    """
+    keys = list(dict.fromkeys(_topic_key(t) for t in topics if t and t.strip()))
+    quota = DocQuota(settings.AUTO_ENRICH_MAX_DOCS)
+    deadline = time.monotonic() + time_budget_s
+    tasks = []
+    for k in keys:
+        cur = _inflight.get((workspace, k))
+        if cur is None or cur[0].done() or cur[1] < deadline - DEDUPE_SLACK_S:
+            task = asyncio.ensure_future(auto_enrich(
+                workspace=workspace, topics=[k], openai_key=openai_key,
+                max_docs=settings.AUTO_ENRICH_MAX_PER_TOPIC, max_per_topic=settings.AUTO_ENRICH_MAX_PER_TOPIC,
+                time_budget_s=time_budget_s, quota=quota,
+            ))
+            _inflight[(workspace, k)] = (task, deadline)
+            task.add_done_callback(lambda t, key=(workspace, k): (_inflight.get(key) or (None,))[0] is t and _inflight.pop(key))
+            _stats["topics_started"] += 1
+        else:
+            task = cur[0]
+            _stats["topics_deduped"] += 1
+        tasks.append(task)
+    if not tasks:
+        return []
+    done, _ = await asyncio.wait(tasks, timeout=time_budget_s)   # never cancels the tasks
+    ids: List[str] = []
+    for t in tasks:
+        if t not in done:
+            continue
+        if t.cancelled() or t.exception() is not None:
+            log.warning("enrichment topic failed: %r", None if t.cancelled() else t.exception())
+            continue
+        ids += [i for i in t.result() if i not in ids]
+    return ids[:settings.AUTO_ENRICH_MAX_DOCS]
+
+@dataclass
+class Ticket:
+    id: str
+    workspace: str
+    query_id: str
+    status: str = "pending"                      # pending | running | done | failed
+    result: Dict[str, Any] | None = None
+    error: str | None = None
+    created: float = field(default_factory=time.time)
+    finished: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def view(self) -> Dict[str, Any]:
+        out = {"ticket": self.id, "status": self.status, "query_id": self.query_id}
+        if self.result is not None:
+            out["result"] = self.result
+        if self.error:
+            out["error"] = self.error
+        return out
+
+_tickets: Dict[str, Ticket] = {}
+_tasks: set = set()
+_sem: asyncio.Semaphore | None = None
+
+def _prune() -> None:
+    now = time.time()
+    for tid in [tid for tid, t in _tickets.items() if t.finished.is_set() and now - t.created > settings.ENRICH_TICKET_TTL_S]:
+        del _tickets[tid]
+
+def submit(*, workspace: str, query_id: str, job: Callable[[], Awaitable[Dict[str, Any]]]) -> Ticket:
+    """Run `job` (the enrichment + second answer pass) in the background, at most ENRICH_BACKGROUND_CONCURRENCY at once."""
+    global _sem
+    if _sem is None:
+        _sem = asyncio.Semaphore(settings.ENRICH_BACKGROUND_CONCURRENCY)
+    _prune()
+    ticket = Ticket(id=uuid.uuid4().hex, workspace=workspace, query_id=query_id)
+    _tickets[ticket.id] = ticket
+    _stats["tickets"] += 1
+
+    async def _run():
+        async with _sem:
+            ticket.status = "running"
+            try:
+                ticket.result = await job()
+                ticket.status = "done"
+                _stats["done"] += 1
+            except Exception as e:
+                log.exception("background enrichment failed")
+                ticket.status, ticket.error = "failed", str(e)
+                _stats["failed"] += 1
+            finally:
+                ticket.finished.set()
+
+    task = asyncio.ensure_future(_run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return ticket
+
+def get(ticket_id: str, workspace: str) -> Ticket | None:
+    t = _tickets.get(ticket_id)
+    return t if t and t.workspace == workspace else None
+
+async def cancel_all() -> None:
+    for t in list(_tasks):
+        t.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+
+def stats() -> Dict[str, Any]:
+    return {**_stats, "inflight_topics": len(_inflight), "open_tickets": sum(1 for t in _tickets.values() if not t.finished.is_set())}
@@ -0,0 +1,69 @@
+from html.parser import HTMLParser
+from typing import List
+
+# content of these never reaches the text (scripts, styling, navigation chrome)
+_SKIP = frozenset({"script", "style", "noscript", "template", "svg", "head", "nav", "header", "footer", "aside", "form", "iframe"})
+_BLOCK = frozenset({
+    "p", "div", "br", "li", "ul", "ol", "tr", "td", "th", "table", "section", "article", "main",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "dd", "dt", "hr",
+})
+
+class TextExtractor(HTMLParser):
+    """
+    Incremental HTML-to-text: feed() decoded pieces as they arrive, text() at
+    the end. Boilerplate elements are dropped on the fly, block elements become
+    line breaks, and collection stops once `max_chars` of text were seen
+    (`full` turns True so the caller can stop reading the body).
+    """
+    def __init__(self, max_chars: int, *, html: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.max_chars, self.html = max_chars, html
+        self.full = False
+        self._parts: List[str] = []
+        self._size = 0
+        self._skip = 0
+
+    def feed(self, data: str) -> None:
+        if self.full or not data:
+            return
+        if self.html:
+            super().feed(data)
+        else:
+            self._add(data)
+
+    def _add(self, s: str) -> None:
+        room = self.max_chars - self._size
+        if room <= 0:
+            self.full = True
+            return
+        s = s[:room]
+        self._parts.append(s)
+        self._size += len(s)
+        if self._size >= self.max_chars:
+            self.full = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP:
+            self._skip += 1
+        elif tag in _BLOCK:
+            self._parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._add(data)
+
+    def text(self) -> str:
+        if self.html and not self.full:
+            self.close()
+        lines = (" ".join(line.split()) for line in "".join(self._parts).splitlines())
+        return "\n".join(line for line in lines if line)
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from app.config import settings
+from app.services.breaker import CircuitBreaker
+
+_lock = threading.Lock()
+_clients: "OrderedDict[str, AsyncOpenAI]" = OrderedDict()
+_retired: set = set()            # evicted, not closed yet
+_closing: set = set()            # their close tasks
+
+def get_async_client(api_key: str) -> AsyncOpenAI:
+    """
+    Shared AsyncOpenAI client per API key. Each client keeps a pooled
+    keep-alive connection set, so requests skip the TLS handshake. Keys
+    supplied per request (X-OpenAI-Key) are bounded by LLM_MAX_CLIENTS, LRU.
+    """
+    with _lock:
+        client = _clients.get(api_key)
+        if client is not None:
+            _clients.move_to_end(api_key)
+            return client
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+            )),
+        )
+        _clients[api_key] = client
+        while len(_clients) > settings.LLM_MAX_CLIENTS:
+            _retire(_clients.popitem(last=False)[1])
+        return client
+
+def _retire(client: AsyncOpenAI) -> None:
+    # an evicted client may still serve requests that picked it up: close its pool once they are past their budget
+    _retired.add(client)
+    try:
+        task = asyncio.get_running_loop().create_task(_close_later(client))
+    except RuntimeError:
+        return  # no loop here; aclose_clients closes it at shutdown
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+async def _close_later(client: AsyncOpenAI) -> None:
+    await asyncio.sleep(settings.LLM_BUDGET_MS / 1000.0)
+    with _lock:
+        if client not in _retired:
+            return
+        _retired.discard(client)
+    await client.close()
+
+async def aclose_clients() -> None:
+    with _lock:
+        clients = list(_clients.values()) + list(_retired)
+        _clients.clear(); _retired.clear()
+    for t in list(_closing):
+        t.cancel()
+    for c in clients:
+        await c.close()
+
+
+# One breaker for the chat provider as a whole: only failures that point at the
+# provider (timeouts, connection errors, 5xx) count, so a bad per-request key
+# cannot open it for everyone.
+chat_breaker = CircuitBreaker(
+    "chat",
+    window=settings.LLM_BREAKER_WINDOW,
+    min_calls=settings.LLM_BREAKER_MIN_CALLS,
+    error_rate=settings.LLM_BREAKER_ERROR_RATE,
+    slow_s=settings.LLM_BREAKER_SLOW_MS / 1000.0,
+    slow_rate=settings.LLM_BREAKER_SLOW_RATE,
+    open_s=settings.LLM_BREAKER_OPEN_S,
+    half_open_probes=settings.LLM_BREAKER_HALF_OPEN_PROBES,
+)
+_latencies: deque = deque(maxlen=500)
+_hedge = {"fired": 0, "won": 0}
+
+def is_provider_failure(exc: BaseException) -> bool:
+    return isinstance(exc, (openai.APIConnectionError, openai.InternalServerError, asyncio.TimeoutError))
+
+def hedge_delay() -> float | None:
+    """Seconds to wait before a hedged second attempt (p-quantile of recent latencies)."""
+    if not settings.LLM_HEDGE_ENABLED:
+        return None
+    lat = sorted(_latencies)
+    if len(lat) < settings.LLM_HEDGE_MIN_SAMPLES:
+        return None
+    q = lat[min(len(lat) - 1, int(len(lat) * settings.LLM_HEDGE_QUANTILE))]
+    return max(q, settings.LLM_HEDGE_MIN_DELAY_MS / 1000.0)
+
+async def _attempt(client: AsyncOpenAI, kwargs: Dict[str, Any]):
+    t0 = time.monotonic()
+    resp = await client.chat.completions.create(**kwargs)
+    _latencies.append(time.monotonic() - t0)
+    return resp
+
+async def _hedged(client: AsyncOpenAI, kwargs: Dict[str, Any], delay: float | None):
+    first = asyncio.ensure_future(_attempt(client, kwargs))
+    if delay is None:
+        return await first
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+        second = asyncio.ensure_future(_attempt(client, kwargs))
+        pending.add(second)
+        _hedge["fired"] += 1
+        err: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    if t is second:
+                        _hedge["won"] += 1
+                    return t.result()
+                err = t.exception()
+        raise err
+    finally:
+        for t in pending:
+            t.cancel()
+
+async def chat_completion(api_key: str, *, timeout: float | None = None, **kwargs):
+    """
+    Non-streaming chat completion behind the provider circuit breaker, with an
+    optional hedged second request after the recent p95 latency
+    (LLM_HEDGE_ENABLED). Raises CircuitOpenError without calling out while the
+    breaker is open, asyncio.TimeoutError past `timeout`.
+    """
+    probe = chat_breaker.acquire() if settings.LLM_BREAKER_ENABLED else False
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    t0 = time.monotonic()
+    try:
+        resp = await asyncio.wait_for(_hedged(get_async_client(api_key), kwargs, hedge_delay()), timeout)
+    except asyncio.TimeoutError:
+        elapsed = time.monotonic() - t0
+        # cut short by the caller's budget: only informative once it is already slow
+        if settings.LLM_BREAKER_ENABLED:
+            if elapsed >= chat_breaker.slow_s:
+                chat_breaker.record(True, elapsed, probe=probe)
+            else:
+                chat_breaker.release(probe)
+        raise
+    except BaseException as e:
+        if settings.LLM_BREAKER_ENABLED:
+            if is_provider_failure(e):
+                chat_breaker.record(False, probe=probe)
+            else:
+                chat_breaker.release(probe)
+        raise
+    if settings.LLM_BREAKER_ENABLED:
+        chat_breaker.record(True, time.monotonic() - t0, probe=probe)
+    return resp
+
+def stats() -> Dict[str, Any]:
+    lat = sorted(_latencies)
+    return {
+        "breaker": chat_breaker.stats(),
+        "hedges_fired": _hedge["fired"],
+        "hedges_won": _hedge["won"],
+        "p95_ms": round(lat[int(len(lat) * 0.95) if len(lat) > 1 else 0] * 1000, 1) if lat else None,
+    }
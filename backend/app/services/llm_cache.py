@@ -0,0 +1,72 @@
+import hashlib, logging, threading
+from datetime import timedelta
+from typing import Any, Dict, Iterable
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import models
+
+log = logging.getLogger("app.llm_cache")
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+def completion_key(*, model: str, prompt_version: str, question: str, chunk_shas: Iterable[str]) -> str:
+    h = hashlib.sha256()
+    for part in (model, prompt_version, question, *chunk_shas):
+        h.update(part.encode("utf-8")); h.update(b"\x1f")
+    return h.hexdigest()
+
+def _bump(name: str, n: int = 1) -> None:
+    with _lock: _stats[name] += n
+
+def get(db: Session, key: str) -> Dict[str, Any] | None:
+    t = models.LLMCompletion
+    cutoff = func.now() - timedelta(seconds=settings.LLM_CACHE_TTL_S)
+    row = db.execute(
+        update(t)
+        .where(t.key == key, t.created_at > cutoff)
+        .values(hits=t.hits + 1, last_used_at=func.now())
+        .returning(t.response)
+    ).first()
+    db.commit()
+    _bump("hits" if row else "misses")
+    return dict(row[0]) if row else None
+
+def put(db: Session, key: str, response: Dict[str, Any]) -> None:
+    t = models.LLMCompletion
+    stmt = pg_insert(t).values(key=key, model=settings.CHAT_MODEL, response=response, hits=0,
+                               created_at=func.now(), last_used_at=func.now())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.key],
+        set_={"response": stmt.excluded.response, "created_at": func.now(), "last_used_at": func.now()},
+    )
+    db.execute(stmt); db.commit()
+    with _lock:
+        _stats["stores"] += 1
+        due = _stats["stores"] % max(1, settings.LLM_CACHE_EVICT_EVERY) == 0
+    if due:
+        evict(db)
+
+def evict(db: Session) -> int:
+    """Drop expired rows, then the least recently used ones above LLM_CACHE_MAX_ROWS."""
+    t = models.LLMCompletion
+    cutoff = func.now() - timedelta(seconds=settings.LLM_CACHE_TTL_S)
+    n = db.execute(delete(t).where(t.created_at <= cutoff)).rowcount or 0
+    excess = (db.execute(select(func.count()).select_from(t)).scalar() or 0) - settings.LLM_CACHE_MAX_ROWS
+    if excess > 0:
+        oldest = select(t.key).order_by(t.last_used_at.asc()).limit(excess).scalar_subquery()
+        n += db.execute(delete(t).where(t.key.in_(oldest))).rowcount or 0
+    db.commit()
+    if n:
+        _bump("evicted", n)
+        log.info("evicted %d cached completions", n)
+    return n
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+    return out
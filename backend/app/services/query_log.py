@@ -0,0 +1,159 @@
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import crud, models
+from app.db.session import SessionLocal
+from app.services import reputation
+
+log = logging.getLogger(__name__)
+
+# Write-behind recorder for Query rows: /ask hands over the finished row and
+# returns; a daemon thread upserts buffered rows in batches. Rows are keyed by
+# the client-generated id, so a retried flush is idempotent. Feedback sent to a
+# worker that does not hold the row waits in pending_feedback and is attached
+# once the row is written.
+_cond = threading.Condition()
+_pending: Dict[uuid.UUID, Dict[str, Any]] = {}
+_flush_lock = threading.Lock()
+_thread: threading.Thread | None = None
+_stopping = False
+PENDING_FEEDBACK_TTL = timedelta(days=1)   # ids that never show up (unknown or lost) are dropped after this
+_stats = {"recorded": 0, "flushed": 0, "flushes": 0, "failed_flushes": 0, "overflow": 0}
+
+def new_id() -> uuid.UUID:
+    return uuid.uuid4()
+
+def row(*, query_id: uuid.UUID, workspace: str, question: str, out: Dict[str, Any]) -> Dict[str, Any]:
+    conf_map = {"low": 0.2, "medium": 0.6, "high": 0.9}
+    return {
+        "id": query_id,
+        "workspace_id": workspace,
+        "question": question,
+        "answer": out.get("answer", ""),
+        "confidence": conf_map.get(out.get("confidence", "medium"), 0.5),
+        "missing_info": out.get("missing_info") or [],
+        "suggested_enrichment": out.get("suggested_enrichment") or [],
+        "used_chunk_ids": [uuid.UUID(c["chunk_id"]) for c in out.get("citations", []) if "chunk_id" in c],
+        "used_document_ids": list(dict.fromkeys(uuid.UUID(c["document_id"]) for c in out.get("citations", []) if c.get("document_id"))),
+        # naive UTC, like the column's server-side default
+        "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+    }
+
+def write_now(rows: List[Dict[str, Any]]) -> None:
+    db = SessionLocal()
+    try:
+        crud.upsert_queries(db, rows)
+        attach_feedback(db, [r["id"] for r in rows], expire=True)
+    finally:
+        db.close()
+
+def attach_feedback(db: Session, query_ids: List[uuid.UUID], *, expire: bool = False) -> int:
+    """
+    Move pending feedback of queries that now exist into feedback and count
+    their votes. DELETE ... RETURNING claims each row once, so the flush and
+    the /feedback request may both try. Returns the number attached.
+    """
+    p, q = models.PendingFeedback, models.Query
+    claimed = db.execute(
+        delete(p).where(p.query_id.in_(query_ids), p.query_id == q.id, p.workspace_id == q.workspace_id)
+        .returning(p.id, p.query_id, p.rating, p.comment, p.created_at, q.workspace_id, q.used_chunk_ids, q.used_document_ids)
+    ).all()
+    if expire:
+        db.execute(delete(p).where(p.created_at < func.now() - PENDING_FEEDBACK_TTL))
+    if claimed:
+        db.add_all([models.Feedback(id=r.id, query_id=r.query_id, rating=r.rating, comment=r.comment, created_at=r.created_at)
+                    for r in claimed])
+    db.commit()
+    for r in claimed:
+        reputation.record(r.workspace_id, document_ids=r.used_document_ids or [], chunk_ids=r.used_chunk_ids or [], rating=r.rating)
+    return len(claimed)
+
+def attach_feedback_now(query_id: uuid.UUID) -> int:
+    db = SessionLocal()
+    try:
+        return attach_feedback(db, [query_id])
+    finally:
+        db.close()
+
+def record(r: Dict[str, Any]) -> bool:
+    """
+    Buffer a row for the background flush. Returns False when write-behind is
+    off or the buffer is full; the caller then writes it itself (write_now).
+    """
+    global _thread
+    if not settings.QUERY_WRITE_BEHIND_ENABLED or _stopping:
+        return False
+    with _cond:
+        if len(_pending) >= settings.QUERY_WRITE_BEHIND_MAX_PENDING:
+            _stats["overflow"] += 1
+            _cond.notify()
+            return False
+        _pending[r["id"]] = r
+        _stats["recorded"] += 1
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="query-log-flush", daemon=True)
+            _thread.start()
+        if len(_pending) >= settings.QUERY_WRITE_BEHIND_BATCH:
+            _cond.notify()
+    return True
+
+def is_pending(query_id: uuid.UUID) -> bool:
+    with _cond:
+        return query_id in _pending
+
+def flush() -> int:
+    """Write everything buffered so far; returns the number of rows written."""
+    with _flush_lock:
+        with _cond:
+            batch = list(_pending.values())
+        if not batch:
+            return 0
+        try:
+            for i in range(0, len(batch), settings.QUERY_WRITE_BEHIND_BATCH):
+                write_now(batch[i:i + settings.QUERY_WRITE_BEHIND_BATCH])
+        except Exception:
+            _stats["failed_flushes"] += 1
+            raise
+        with _cond:
+            for r in batch:
+                # a row re-recorded meanwhile stays for the next flush
+                if _pending.get(r["id"]) is r:
+                    del _pending[r["id"]]
+        _stats["flushes"] += 1
+        _stats["flushed"] += len(batch)
+        return len(batch)
+
+def _run() -> None:
+    while True:
+        with _cond:
+            if not _pending and _stopping:
+                return
+            _cond.wait(timeout=settings.QUERY_WRITE_BEHIND_INTERVAL_MS / 1000.0)
+        try:
+            flush()
+        except Exception:
+            log.exception("query write-behind flush failed; rows stay buffered")
+            if _stopping:
+                return
+
+def stop() -> None:
+    """Stop the flusher and write what is left (app shutdown)."""
+    global _stopping
+    _stopping = True
+    with _cond:
+        _cond.notify()
+    if _thread is not None:
+        _thread.join(timeout=10)
+    try:
+        flush()
+    except Exception:
+        log.exception("final query flush failed; %d rows lost", len(_pending))
+
+def stats() -> Dict[str, Any]:
+    with _cond:
+        return {**_stats, "pending": len(_pending)}
@@ -1,51 +1,96 @@
+import asyncio
 from statistics import mean
 from uuid import UUID
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
 from app.config import settings
 from app.db import crud, models
 from app.services.embedding import embed_batch
 from app.services.pinecone_client import get_index
+from app.services import conversation as conversation_pool, reputation
 from urllib.parse import urlparse
 
-def retrieve_topk(db: Session, *, query_text: str, workspace: str, api_key: str | None, topk: int | None = None, boost: float = 0.1):
-    topk = topk or settings.TOPK
-    q_vec = embed_batch([query_text], model=settings.EMBEDDING_MODEL, api_key=api_key)[0]
+def embed_query(query_text: str, api_key: str | None = None) -> list[float]:
+    return embed_batch([query_text], model=settings.EMBEDDING_MODEL, api_key=api_key)[0]
+
+def vector_search(workspace: str, q_vec: list[float], topk: int | None = None, include_values: bool = False) -> list:
     idx = get_index()
-    res = idx.query(namespace=workspace, vector=q_vec, top_k=topk, include_metadata=True)
-    matches = getattr(res, "matches", None) or res.get("matches", []) or []
+    res = idx.query(namespace=workspace, vector=q_vec, top_k=topk or settings.TOPK, include_metadata=True,
+                    include_values=include_values)
+    return getattr(res, "matches", None) or res.get("matches", []) or []
+
+def retrieve_topk(db: Session, *, query_text: str, workspace: str, api_key: str | None, topk: int | None = None, boost: float = 0.1,
+                  q_vec: list[float] | None = None):
+    if q_vec is None:
+        q_vec = embed_query(query_text, api_key=api_key)
+    matches = vector_search(workspace, q_vec, topk)
+    ranked_rows, avg_score = rank_matches(db, matches, workspace=workspace, boost=boost)
+    return matches, ranked_rows, avg_score
+
+async def aretrieve_topk(db: AsyncSession, *, query_text: str, workspace: str, api_key: str | None, topk: int | None = None,
+                         boost: float = 0.1, q_vec: list[float] | None = None, timeout: float | None = None,
+                         conversation: str | None = None):
+    """
+    Async retrieve_topk: embedding and the vector query run on the threadpool,
+    DB lookups on the async session. `timeout` bounds the embedding + vector
+    query part (asyncio.TimeoutError); DB work is never cancelled midway.
+    With a `conversation` key, follow-ups close to the candidates of earlier
+    turns are re-scored from that pool instead of querying the vector store.
+    """
+    async def _search():
+        vec = q_vec if q_vec is not None else await run_in_threadpool(embed_query, query_text, api_key)
+        if not conversation:
+            return await run_in_threadpool(vector_search, workspace, vec, topk)
+        matches = conversation_pool.reuse(conversation, vec, topk or settings.TOPK)
+        if matches is None:
+            matches = await run_in_threadpool(vector_search, workspace, vec, topk, True)
+            conversation_pool.remember(conversation, workspace, matches)
+        return matches
+
+    matches = await asyncio.wait_for(_search(), timeout)
+    ranked_rows, avg_score = await db.run_sync(rank_matches, matches, workspace=workspace, boost=boost)
+    return matches, ranked_rows, avg_score
+
+def _match_fields(m):
+    meta = m["metadata"] if isinstance(m, dict) else m.metadata
+    return meta.get("chunk_id"), meta.get("document_id"), float(m.get("score", getattr(m, "score", 0.0)))
 
-    chunk_ids, scores, doc_ids = [], [], []
+def _fetch_for_ranking(db: Session, matches: list, *, workspace: str):
+    chunk_ids = set()
     for m in matches:
-        meta = m["metadata"] if isinstance(m, dict) else m.metadata
-        cid = meta.get("chunk_id"); did = meta.get("document_id")
+        cid, did, _ = _match_fields(m)
         if cid and did:
-            chunk_ids.append(UUID(cid)); doc_ids.append(UUID(did))
-            scores.append(float(m.get("score", getattr(m, "score", 0.0))))
+            chunk_ids.add(UUID(cid))
 
-    rows = crud.get_chunks_by_ids(db, chunk_ids)
+    rows = crud.get_chunks_by_ids(db, list(chunk_ids))
     by_id = {str(r.id): r for r in rows}
+    return by_id, reputation.priors(db, workspace)
 
-    reps = db.query(models.DocumentReputation).filter(
-        models.DocumentReputation.workspace_id == workspace,
-        models.DocumentReputation.document_id.in_(set(doc_ids))
-    ).all()
-    rep_map = {str(r.document_id): float(r.score or 0.0) for r in reps}
-
-    ordered = []
+def _rank(matches: list, by_id: dict, priors: reputation.Priors, boost: float):
+    scores, ordered = [], []
     for m in matches:
-        meta = m["metadata"] if isinstance(m, dict) else m.metadata
-        cid = meta.get("chunk_id"); did = meta.get("document_id")
+        cid, did, base = _match_fields(m)
+        if not (cid and did): continue
+        scores.append(base)
         row = by_id.get(str(cid))
         if not row: continue
-        base = float(m.get("score", getattr(m, "score", 0.0)))
-        prior = rep_map.get(str(did), 0.0)
-        final = base + boost * prior
+        final = base + boost * priors.get(str(did), str(cid))
         ordered.append((final, row))
 
     ordered.sort(key=lambda x: x[0], reverse=True)
     ranked_rows = [r for _, r in ordered]
     avg_score = sum(scores[:5]) / max(1, min(5, len(scores)))
-    return matches, ranked_rows, avg_score
+    return ranked_rows, avg_score
+
+def rank_matches(db: Session, matches: list, *, workspace: str, boost: float = 0.1):
+    by_id, priors = _fetch_for_ranking(db, matches, workspace=workspace)
+    return _rank(matches, by_id, priors, boost)
+
+def rank_matches_batch(db: Session, matches_list: list[list], *, workspace: str, boost: float = 0.1):
+    """rank_matches for several queries, fetching the union of their chunks once."""
+    by_id, priors = _fetch_for_ranking(db, [m for ms in matches_list for m in ms], workspace=workspace)
+    return [_rank(ms, by_id, priors, boost) for ms in matches_list]
 
 def select_context(rows, max_chunks: int):
     if not rows: return []
@@ -60,23 +105,28 @@ def select_context(rows, max_chunks: int):
             if r not in picked: picked.append(r)
     return picked
 
-def build_context_block(rows, db=None, filename_by_chunk: dict[str, str] | None = None):
-    names_by_doc, meta_by_doc = {}, {}
-
-    if db and rows:
-        from app.db import models as db_models
-        doc_ids = list({r.document_id for r in rows})
-        pairs = (
-            db.query(db_models.Document.id, db_models.Document.filename, db_models.Document.meta)
-              .filter(db_models.Document.id.in_(doc_ids))
-              .all()
-        )
-        for did, fname, meta in pairs:
-            names_by_doc[str(did)] = fname
-            meta_by_doc[str(did)] = meta or {}
+def doc_meta_map(db, rows) -> dict[str, tuple[str, dict]]:
+    from app.db import models as db_models
+    doc_ids = list({r.document_id for r in rows})
+    if not doc_ids: return {}
+    pairs = (
+        db.query(db_models.Document.id, db_models.Document.filename, db_models.Document.meta)
+          .filter(db_models.Document.id.in_(doc_ids))
+          .all()
+    )
+    return {str(did): (fname, meta or {}) for did, fname, meta in pairs}
+
+def build_context_block(rows, db=None, filename_by_chunk: dict[str, str] | None = None,
+                        text_by_chunk: dict[str, str] | None = None,
+                        doc_meta: dict[str, tuple[str, dict]] | None = None):
+    if doc_meta is None:
+        doc_meta = doc_meta_map(db, rows) if (db and rows) else {}
+    names_by_doc = {did: fname for did, (fname, _) in doc_meta.items()}
+    meta_by_doc = {did: meta for did, (_, meta) in doc_meta.items()}
 
     blocks, citations = [], []
     filename_by_chunk = filename_by_chunk or {}
+    text_by_chunk = text_by_chunk or {}
 
     for i, ch in enumerate(rows, start=1):
         did = str(ch.document_id)
@@ -96,7 +146,8 @@ def build_context_block(rows, db=None, filename_by_chunk: dict[str, str] | None
             page_str = f", p.{ch.page_start}-{ch.page_end}"
 
         header = f"[{i}] ({fname}{page_str})"
-        blocks.append(f"{header}\n{(ch.text or '').strip()}")
+        body = text_by_chunk.get(str(ch.id)) or ch.text or ""
+        blocks.append(f"{header}\n{body.strip()}")
 
         citations.append({
             "n": i,
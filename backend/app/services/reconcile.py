@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Set
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import crud, models
+from app.services import answer_cache, conversation
+from app.services.pinecone_client import get_index
+from app.services.vectorize import delete_vectors, sync_documents
+
+log = logging.getLogger(__name__)
+
+# Vector store <-> Postgres reconciliation for one workspace (= namespace):
+# page through the namespace's vector ids and the workspace's chunk ids, diff
+# the two sets, then delete orphan vectors (no chunk) by id and embed missing
+# chunks (no vector) through the incremental sync.
+
+_running: Set[str] = set()
+_lock = threading.Lock()
+_last: Dict[str, Dict[str, Any]] = {}
+
+def _chunk_id(vector_id: str) -> uuid.UUID | None:
+    try:
+        return uuid.UUID(vector_id.rsplit(":", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def vector_ids(idx, workspace: str) -> Dict[uuid.UUID | None, List[str]]:
+    """chunk id -> vector ids in the namespace (None collects ids that do not parse)."""
+    out: Dict[uuid.UUID | None, List[str]] = {}
+    token = None
+    while True:
+        page = idx.list_paginated(namespace=workspace, prefix=f"{workspace}:",
+                                  limit=settings.RECONCILE_PAGE_SIZE, pagination_token=token)
+        for v in page.vectors or []:
+            out.setdefault(_chunk_id(v.id), []).append(v.id)
+        token = page.pagination.next if page.pagination else None
+        if not token:
+            return out
+
+def chunk_ids(db: Session, workspace: str) -> Dict[uuid.UUID, uuid.UUID]:
+    """chunk id -> document id for the workspace, streamed in RECONCILE_DB_BATCH rows."""
+    c, d = models.Chunk, models.Document
+    q = select(c.id, c.document_id).join(d, d.id == c.document_id).where(d.workspace_id == workspace)
+    return {r.id: r.document_id for r in db.execute(q.execution_options(yield_per=settings.RECONCILE_DB_BATCH))}
+
+def _without_chunks(db: Session, workspace: str) -> int:
+    c, d = models.Chunk, models.Document
+    return db.execute(
+        select(func.count()).select_from(d).where(d.workspace_id == workspace, ~exists().where(c.document_id == d.id))
+    ).scalar() or 0
+
+def run(db: Session, *, workspace: str, openai_key: str | None, dry_run: bool = False) -> Dict[str, Any]:
+    with _lock:
+        if workspace in _running:
+            raise RuntimeError("reconciliation already running for this workspace")
+        _running.add(workspace)
+    try:
+        report = _run(db, workspace=workspace, openai_key=openai_key, dry_run=dry_run)
+        _last[workspace] = report
+        return report
+    finally:
+        with _lock:
+            _running.discard(workspace)
+
+def _run(db: Session, *, workspace: str, openai_key: str | None, dry_run: bool) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    idx = get_index()
+    vectors = vector_ids(idx, workspace)
+    t_list = time.perf_counter() - t0
+    chunks = chunk_ids(db, workspace)
+    unparsable = vectors.pop(None, [])
+    orphans = vectors.keys() - chunks.keys()
+    missing = chunks.keys() - vectors.keys()
+    missing_docs = {chunks[c] for c in missing}
+    report: Dict[str, Any] = {
+        "workspace": workspace,
+        "dry_run": dry_run,
+        "vectors": sum(len(v) for v in vectors.values()) + len(unparsable),
+        "chunks": len(chunks),
+        "orphan_vectors": sum(len(vectors[c]) for c in orphans) + len(unparsable),
+        "missing_vectors": len(missing),
+        "documents_missing_vectors": len(missing_docs),
+        "documents_without_chunks": _without_chunks(db, workspace),  # need a re-upload; nothing to embed
+        "deleted": 0, "embedded": 0, "failed_documents": {},
+        "list_s": round(t_list, 2),
+    }
+    if not dry_run:
+        with ThreadPoolExecutor(max_workers=max(1, settings.REINDEX_CONCURRENCY), thread_name_prefix="reconcile") as pool:
+            report["deleted"] = _delete_orphans(db, pool, workspace, orphans, vectors, unparsable)
+            embedded, failed = _embed_missing(db, pool, workspace, missing, missing_docs, openai_key)
+        report["embedded"], report["failed_documents"] = embedded, {str(k): v for k, v in failed.items()}
+        crud.refresh_document_counts(db, workspace=workspace)
+        db.commit()
+        if report["deleted"] or embedded:
+            answer_cache.invalidate_workspace(workspace)
+            conversation.invalidate_workspace(workspace)
+    report["runtime_s"] = round(time.perf_counter() - t0, 2)
+    log.info("reconciled %s: %s", workspace, report)
+    return report
+
+def _delete_orphans(db: Session, pool: ThreadPoolExecutor, workspace: str, orphans, vectors, unparsable) -> int:
+    owned = {c: vectors[c] for c in orphans}
+    if unparsable:
+        owned[None] = unparsable
+    failed = delete_vectors(workspace, owned, pool)
+    _delete_records(db, [c for c in orphans if c not in failed])
+    return sum(len(ids) for k, ids in owned.items() if k not in failed)
+
+def _delete_records(db: Session, chunk_ids: List[uuid.UUID]) -> None:
+    r, B = models.VectorRecord, max(1, settings.RECONCILE_DB_BATCH)
+    for s in range(0, len(chunk_ids), B):
+        db.execute(delete(r).where(r.chunk_id.in_(chunk_ids[s:s + B])))
+    db.commit()
+
+def _embed_missing(db: Session, pool: ThreadPoolExecutor, workspace: str, missing, missing_docs,
+                   openai_key: str | None) -> tuple[int, Dict[uuid.UUID, str]]:
+    if not missing:
+        return 0, {}
+    # records claiming vectors the index does not have would make the sync skip those chunks
+    _delete_records(db, list(missing))
+    d = models.Document
+    filenames = dict(db.execute(select(d.id, d.filename).where(d.id.in_(list(missing_docs)))).all())
+    docs, embedded, failed = list(filenames), 0, {}
+    W = max(1, settings.REINDEX_WAVE_DOCS)
+    for s in range(0, len(docs), W):
+        wave = docs[s:s + W]
+        res = sync_documents(db, workspace=workspace, filenames={i: filenames[i] for i in wave}, openai_key=openai_key, pool=pool)
+        embedded += res["embedded"]
+        failed.update(res["failed"])
+        ok = [i for i in wave if i not in res["failed"]]
+        if ok:
+            db.execute(update(d).where(d.id.in_(ok), d.status != "processed").values(status="processed"))
+            db.commit()
+    return embedded, failed
+
+def last_report(workspace: str) -> Dict[str, Any] | None:
+    return _last.get(workspace)
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, List
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import models
+from app.db.session import SessionLocal
+from app.services import answer_cache, conversation
+from app.services.vectorize import clear_documents, sync_documents
+
+log = logging.getLogger(__name__)
+
+# Bulk reindex as background jobs. The reindex_jobs row holds the planned
+# document ids, the ids handled so far and the counters, so any worker can
+# report progress and a cancelled or interrupted job resumes where it stopped.
+# Documents go in waves of REINDEX_WAVE_DOCS through vectorize.sync_documents:
+# only chunks missing from vector_records (or changed) are embedded, embedding
+# batches span documents, and embedding / vector writes run on
+# REINDEX_CONCURRENCY threads. The OpenAI key only lives in the running thread.
+
+ACTIVE = ("pending", "running", "cancelling")
+MAX_ERRORS = 20
+
+_lock = threading.Lock()
+_threads: Dict[uuid.UUID, threading.Thread] = {}
+_cancel: Dict[uuid.UUID, threading.Event] = {}
+_stopping = False
+
+def plan(db: Session, workspace: str, *, document_ids: List[uuid.UUID] | None, all_pending: bool) -> List[uuid.UUID]:
+    d = models.Document
+    q = select(d.id).where(d.workspace_id == workspace)
+    if document_ids:
+        q = q.where(d.id.in_(document_ids))
+    elif all_pending:
+        q = q.where(d.status.in_(["uploaded", "failed"]))
+    return list(db.execute(q.order_by(d.created_at.desc())).scalars())
+
+def _is_live(job_id: uuid.UUID) -> bool:
+    with _lock:
+        th = _threads.get(job_id)
+    return th is not None and th.is_alive()
+
+def active(db: Session, workspace: str) -> models.ReindexJob | None:
+    """A job still working on the workspace here or, judging by its heartbeat, in another worker."""
+    t = models.ReindexJob
+    fresh = t.updated_at > func.now() - timedelta(seconds=settings.REINDEX_STALE_S)
+    for job in db.execute(select(t).where(t.workspace_id == workspace, t.status.in_(ACTIVE))).scalars():
+        if _is_live(job.id) or db.execute(select(fresh).where(t.id == job.id)).scalar():
+            return job
+    return None
+
+def start(db: Session, *, workspace: str, document_ids: List[uuid.UUID], force: bool, clear_first: bool,
+          openai_key: str | None) -> models.ReindexJob:
+    job = models.ReindexJob(workspace_id=workspace, force=force, clear_first=clear_first,
+                            document_ids=document_ids, done_ids=[], total=len(document_ids))
+    db.add(job); db.commit(); db.refresh(job)
+    _launch(job.id, openai_key)
+    return job
+
+def resume(db: Session, job: models.ReindexJob, openai_key: str | None) -> models.ReindexJob:
+    job.status, job.error, job.finished_at = "pending", None, None
+    db.add(job); db.commit(); db.refresh(job)
+    _launch(job.id, openai_key)
+    return job
+
+def cancel(db: Session, job: models.ReindexJob) -> models.ReindexJob:
+    """Running jobs stop after the current wave; a job nobody is running any more is marked cancelled directly."""
+    with _lock:
+        ev = _cancel.get(job.id)
+    if ev is not None:
+        ev.set()
+    if job.status in ACTIVE:
+        running = active(db, job.workspace_id)
+        job.status = "cancelling" if running is not None and running.id == job.id else "cancelled"
+        db.add(job); db.commit(); db.refresh(job)
+    return job
+
+def view(job: models.ReindexJob) -> Dict[str, Any]:
+    handled = job.processed + job.skipped + job.failed
+    rate = handled / job.elapsed_s if job.elapsed_s else 0.0
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "force": job.force,
+        "clear_first": job.clear_first,
+        "total": job.total,
+        "processed": job.processed,
+        "skipped": job.skipped,
+        "failed": job.failed,
+        "remaining": job.total - handled,
+        "chunks": job.chunks,
+        "elapsed_s": round(job.elapsed_s, 2),
+        "docs_per_s": round(rate, 2),
+        "chunks_per_s": round(job.chunks / job.elapsed_s, 1) if job.elapsed_s else 0.0,
+        "eta_s": round((job.total - handled) / rate, 1) if rate and job.status in ACTIVE else None,
+        "errors": job.errors or {},
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+def _launch(job_id: uuid.UUID, openai_key: str | None) -> None:
+    ev = threading.Event()
+    th = threading.Thread(target=_run, args=(job_id, openai_key, ev), name=f"reindex-{job_id.hex[:8]}", daemon=True)
+    with _lock:
+        _cancel[job_id], _threads[job_id] = ev, th
+    th.start()
+
+def _run(job_id: uuid.UUID, openai_key: str | None, ev: threading.Event) -> None:
+    t = models.ReindexJob
+    db = SessionLocal()
+    workspace = None
+    try:
+        job = db.get(t, job_id)
+        workspace, force, clear_first = job.workspace_id, job.force, job.clear_first
+        done = set(job.done_ids or [])
+        todo = [d for d in job.document_ids if d not in done]
+        job.status = "running"
+        db.commit()
+        W = max(1, settings.REINDEX_WAVE_DOCS)
+        stopped = False
+        with ThreadPoolExecutor(max_workers=max(1, settings.REINDEX_CONCURRENCY), thread_name_prefix="reindex-io") as pool:
+            for s in range(0, len(todo), W):
+                if ev.is_set():
+                    stopped = True
+                    break
+                wave = todo[s:s + W]
+                t0 = time.perf_counter()
+                res = _wave(db, pool, workspace, wave, force=force, clear_first=clear_first, openai_key=openai_key)
+                if _commit_wave(db, job_id, workspace, wave, res, time.perf_counter() - t0) == "cancelling":
+                    ev.set()
+        status = ("interrupted" if _stopping else "cancelled") if stopped else "done"
+        db.execute(update(t).where(t.id == job_id).values(status=status, finished_at=func.now()))
+        db.commit()
+        log.info("reindex job %s %s", job_id, status)
+    except Exception as e:
+        log.exception("reindex job %s failed", job_id)
+        db.rollback()
+        db.execute(update(t).where(t.id == job_id).values(status="failed", error=str(e), finished_at=func.now()))
+        db.commit()
+    finally:
+        if workspace:
+            conversation.invalidate_workspace(workspace)
+        db.close()
+        with _lock:
+            _threads.pop(job_id, None); _cancel.pop(job_id, None)
+
+def _wave(db: Session, pool: ThreadPoolExecutor, workspace: str, wave: List[uuid.UUID], *,
+          force: bool, clear_first: bool, openai_key: str | None) -> Dict[str, Any]:
+    d = models.Document
+    docs = {r.id: r for r in db.execute(select(d.id, d.filename, d.status).where(d.id.in_(wave), d.workspace_id == workspace))}
+    targets = [i for i in wave if i in docs and (force or docs[i].status != "processed")]
+    failed = clear_documents(db, workspace=workspace, document_ids=targets, pool=pool) if clear_first and targets else {}
+    live = [i for i in targets if i not in failed]
+    res = sync_documents(db, workspace=workspace, filenames={i: docs[i].filename for i in live},
+                         openai_key=openai_key, pool=pool)
+    failed.update(res["failed"])
+    ok = [i for i in live if i in res["with_chunks"] and i not in failed]
+    return {
+        "ok": ok,
+        "failed": failed,
+        "skipped": len(wave) - len(ok) - len(failed),  # missing, already processed or without chunks
+        "chunks": res["embedded"],
+    }
+
+def _commit_wave(db: Session, job_id: uuid.UUID, workspace: str, wave: List[uuid.UUID], res: Dict[str, Any], dt: float) -> str:
+    d, t = models.Document, models.ReindexJob
+    if res["ok"]:
+        db.execute(update(d).where(d.id.in_(res["ok"])).values(status="processed"))
+    if res["failed"]:
+        db.execute(update(d).where(d.id.in_(list(res["failed"]))).values(status="failed"))
+    errors = db.execute(select(t.errors).where(t.id == job_id)).scalar() or {}
+    for doc_id, err in res["failed"].items():
+        if len(errors) >= MAX_ERRORS:
+            break
+        errors[str(doc_id)] = err
+    status = db.execute(
+        update(t).where(t.id == job_id).values(
+            done_ids=func.array_cat(t.done_ids, literal(wave, t.done_ids.type)),
+            processed=t.processed + len(res["ok"]),
+            skipped=t.skipped + res["skipped"],
+            failed=t.failed + len(res["failed"]),
+            chunks=t.chunks + res["chunks"],
+            elapsed_s=t.elapsed_s + dt,
+            errors=errors,
+        ).returning(t.status)
+    ).scalar_one()
+    db.commit()
+    answer_cache.invalidate_documents(workspace, res["ok"] + list(res["failed"]))
+    return status
+
+def stop() -> None:
+    """App shutdown: running jobs stop after their current wave and stay resumable ("interrupted")."""
+    global _stopping
+    _stopping = True
+    with _lock:
+        events, threads = list(_cancel.values()), list(_threads.values())
+    for ev in events:
+        ev.set()
+    for th in threads:
+        th.join(timeout=30)
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import models
+from app.db.session import SessionLocal
+
+log = logging.getLogger(__name__)
+
+# Feedback -> retrieval priors. Votes are buffered and summed per (workspace,
+# document | chunk); a flush upserts each kind in one statement that decays the
+# stored up/down weights to now (half-life REPUTATION_HALF_LIFE_DAYS) before
+# adding the new votes, so vote history is never rescanned. Ranking reads the
+# priors from a per-workspace map holding only non-negligible scores, reloaded
+# after a flush touched the workspace or after REPUTATION_CACHE_TTL_S.
+# The feedback rows themselves are committed by the request; only their effect
+# on reputation is deferred.
+
+MIN_PRIOR = 0.005     # smaller |score| is left out of the in-memory map
+WRITE_BATCH = 1000
+
+_cond = threading.Condition()
+_pending: Dict[Tuple[str, str, uuid.UUID], List[int]] = {}   # (workspace, "doc" | "chunk", id) -> [up, down]
+_flush_lock = threading.Lock()
+_thread: threading.Thread | None = None
+_stopping = False
+_load_lock = threading.Lock()
+_loading: set = set()
+_stats = {"votes": 0, "flushes": 0, "flushed_rows": 0, "failed_flushes": 0, "loads": 0}
+
+class Priors:
+    __slots__ = ("docs", "chunks", "loaded")
+
+    def __init__(self, docs: Dict[str, float], chunks: Dict[str, float]):
+        self.docs, self.chunks = docs, chunks
+        self.loaded = time.monotonic()
+
+    def get(self, document_id: str, chunk_id: str) -> float:
+        return self.docs.get(document_id, 0.0) + settings.REPUTATION_CHUNK_WEIGHT * self.chunks.get(chunk_id, 0.0)
+
+_priors: Dict[str, Priors] = {}
+
+def _decay(t):
+    return func.power(0.5, func.extract("epoch", func.now() - t.updated_at) / (settings.REPUTATION_HALF_LIFE_DAYS * 86400.0))
+
+def _score(up, down):
+    return (up - down) / (up + down + settings.REPUTATION_SMOOTHING)
+
+def record(workspace: str, *, document_ids: Iterable[uuid.UUID], chunk_ids: Iterable[uuid.UUID], rating: int) -> int:
+    """Queue one vote for these documents and chunks; returns the number of documents it counts for."""
+    global _thread
+    up, down = int(rating > 0), int(rating < 0)
+    docs = set(document_ids)
+    if not (up or down) or not docs:
+        return 0
+    with _cond:
+        for kind, ids in (("doc", docs), ("chunk", set(chunk_ids))):
+            for i in ids:
+                v = _pending.setdefault((workspace, kind, i), [0, 0])
+                v[0] += up; v[1] += down
+        _stats["votes"] += 1
+        inline = settings.REPUTATION_FLUSH_INTERVAL_MS <= 0 or _stopping
+        if not inline and (_thread is None or not _thread.is_alive()):
+            _thread = threading.Thread(target=_run, name="reputation-flush", daemon=True)
+            _thread.start()
+    if inline:
+        flush()
+    return len(docs)
+
+def _upsert(db: Session, t, key: list, rows: List[Dict[str, Any]]) -> None:
+    for s in range(0, len(rows), WRITE_BATCH):
+        stmt = pg_insert(t).values(rows[s:s + WRITE_BATCH])
+        ex = stmt.excluded
+        up = t.c.up_weight * _decay(t.c) + ex.up_weight
+        down = t.c.down_weight * _decay(t.c) + ex.down_weight
+        db.execute(stmt.on_conflict_do_update(index_elements=key, set_={
+            "up_count": t.c.up_count + ex.up_count,
+            "down_count": t.c.down_count + ex.down_count,
+            "up_weight": up,
+            "down_weight": down,
+            "score": _score(up, down),
+            "updated_at": func.now(),
+        }))
+
+def _write(db: Session, batch: Dict[Tuple[str, str, uuid.UUID], List[int]]) -> int:
+    def _row(u: int, d: int) -> Dict[str, Any]:
+        return {"up_count": u, "down_count": d, "up_weight": float(u), "down_weight": float(d),
+                "score": (u - d) / (u + d + settings.REPUTATION_SMOOTHING), "updated_at": func.now()}
+
+    docs = [{"workspace_id": ws, "document_id": i, **_row(u, d)} for (ws, kind, i), (u, d) in batch.items() if kind == "doc"]
+    chunks = {i: (ws, u, d) for (ws, kind, i), (u, d) in batch.items() if kind == "chunk"}
+    if chunks:
+        # chunks replaced since the answer take their votes with them; KEY SHARE keeps the rest until commit
+        c = models.Chunk
+        live = set(db.execute(select(c.id).where(c.id.in_(list(chunks))).with_for_update(read=True, key_share=True)).scalars())
+        chunks = {i: v for i, v in chunks.items() if i in live}
+    dr, cr = models.DocumentReputation.__table__, models.ChunkReputation.__table__
+    _upsert(db, dr, [dr.c.workspace_id, dr.c.document_id], docs)
+    _upsert(db, cr, [cr.c.chunk_id], [{"chunk_id": i, "workspace_id": ws, **_row(u, d)} for i, (ws, u, d) in chunks.items()])
+    db.commit()
+    return len(docs) + len(chunks)
+
+def flush() -> int:
+    """Write the buffered votes; returns the number of reputation rows updated."""
+    with _flush_lock:
+        with _cond:
+            batch = dict(_pending)
+            _pending.clear()
+        if not batch:
+            return 0
+        db = SessionLocal()
+        try:
+            n = _write(db, batch)
+        except Exception:
+            _stats["failed_flushes"] += 1
+            with _cond:
+                for k, (u, d) in batch.items():
+                    v = _pending.setdefault(k, [0, 0])
+                    v[0] += u; v[1] += d
+            raise
+        finally:
+            db.close()
+        for ws in {k[0] for k in batch}:
+            _priors.pop(ws, None)
+        _stats["flushes"] += 1
+        _stats["flushed_rows"] += n
+        return n
+
+def _run() -> None:
+    while True:
+        with _cond:
+            if not _pending and _stopping:
+                return
+            _cond.wait(timeout=settings.REPUTATION_FLUSH_INTERVAL_MS / 1000.0)
+        try:
+            flush()
+        except Exception:
+            log.exception("reputation flush failed; votes stay buffered")
+            if _stopping:
+                return
+
+def stop() -> None:
+    """Stop the flusher and write what is left (app shutdown)."""
+    global _stopping
+    _stopping = True
+    with _cond:
+        _cond.notify()
+    if _thread is not None:
+        _thread.join(timeout=10)
+    try:
+        flush()
+    except Exception:
+        log.exception("final reputation flush failed; %d updates lost", len(_pending))
+
+def _load(db: Session, workspace: str) -> Priors:
+    maps = []
+    for m, key in ((models.DocumentReputation, models.DocumentReputation.document_id),
+                   (models.ChunkReputation, models.ChunkReputation.chunk_id)):
+        f = _decay(m)
+        rows = db.execute(select(key, _score(m.up_weight * f, m.down_weight * f)).where(m.workspace_id == workspace))
+        maps.append({str(k): float(s) for k, s in rows if abs(s) >= MIN_PRIOR})
+    return Priors(*maps)
+
+def priors(db: Session, workspace: str) -> Priors:
+    """
+    Current (decayed) document and chunk priors of a workspace. Called from
+    run_sync on the event loop, so no lock is held across the load: while one
+    caller reloads, others keep using the expired map.
+    """
+    p = _priors.get(workspace)
+    if p is not None and time.monotonic() - p.loaded < settings.REPUTATION_CACHE_TTL_S:
+        return p
+    with _load_lock:
+        busy = workspace in _loading
+        if not busy:
+            _loading.add(workspace)
+    if busy and p is not None:
+        return p
+    try:
+        p = _priors[workspace] = _load(db, workspace)
+        _stats["loads"] += 1
+    finally:
+        if not busy:
+            with _load_lock:
+                _loading.discard(workspace)
+    return p
+
+def stats() -> Dict[str, Any]:
+    with _cond:
+        pending = len(_pending)
+    return {**_stats, "pending": pending, "workspaces": len(_priors),
+            "priors": sum(len(p.docs) + len(p.chunks) for p in list(_priors.values()))}
@@ -0,0 +1,104 @@
+import hashlib, logging, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Tuple
+from app.config import settings
+
+log = logging.getLogger("app.rerank")
+
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+_BUSY = threading.Lock()   # held while the worker scores; nothing queues behind it
+
+_CACHE: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+def _load_model():
+    global _MODEL
+    if _MODEL is not None: return _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            from sentence_transformers import CrossEncoder
+            _MODEL = CrossEncoder(settings.RERANK_MODEL, device="cpu", max_length=settings.RERANK_MAX_LENGTH)
+    return _MODEL
+
+def _query_hash(query: str) -> str:
+    return hashlib.sha256(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+
+def _chunk_hash(row) -> str:
+    return row.sha256 or hashlib.sha256((row.text or "").encode("utf-8")).hexdigest()
+
+def _cache_get(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+    hits = {}
+    with _CACHE_LOCK:
+        for k in keys:
+            if k in _CACHE:
+                _CACHE.move_to_end(k)
+                hits[k] = _CACHE[k]
+    return hits
+
+def _cache_put(items: Dict[Tuple[str, str], float]) -> None:
+    with _CACHE_LOCK:
+        _CACHE.update(items)
+        while len(_CACHE) > settings.RERANK_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+def _score(query: str, rows: List) -> List[float]:
+    qh = _query_hash(query)
+    keys = [(qh, _chunk_hash(r)) for r in rows]
+    scores = _cache_get(keys)
+    todo = [i for i, k in enumerate(keys) if k not in scores]
+    if todo:
+        pairs = [(query, rows[i].text or "") for i in todo]
+        # one padded batch for all uncached pairs
+        preds = _load_model().predict(pairs, batch_size=len(pairs), show_progress_bar=False, convert_to_numpy=True)
+        fresh = {keys[i]: float(p) for i, p in zip(todo, preds)}
+        _cache_put(fresh)
+        scores.update(fresh)
+    return [scores[k] for k in keys]
+
+def rerank(query: str, rows: List, *, budget_ms: float | None = None) -> Tuple[List, bool]:
+    """
+    Reorder retrieved chunk rows by cross-encoder relevance to the query.
+    Trivially short queries skip the stage; if scoring does not finish within
+    the latency budget (or fails) the vector order is returned unchanged and
+    the flag is False. A timed-out batch keeps running in the background and
+    still fills the cache; while it does, other calls skip scoring (fully
+    cached ones are still reordered).
+    """
+    if not rows or len(query.split()) < settings.RERANK_MIN_QUERY_WORDS:
+        return rows, True
+    budget = (settings.RERANK_BUDGET_MS if budget_ms is None else budget_ms) / 1000.0
+    qh = _query_hash(query)
+    cached = _cache_get([(qh, _chunk_hash(r)) for r in rows])
+    if len(cached) == len(rows):
+        scores = [cached[(qh, _chunk_hash(r))] for r in rows]
+        order = sorted(range(len(rows)), key=lambda i: scores[i], reverse=True)
+        return [rows[i] for i in order], True
+    # a batch still running (e.g. one that outlived its budget) would eat this one's budget: skip instead of queueing
+    if not _BUSY.acquire(blocking=False):
+        log.info("reranker busy; keeping vector order")
+        return rows, False
+
+    def _run():
+        try:
+            return _score(query, rows)
+        finally:
+            _BUSY.release()
+
+    try:
+        fut = _POOL.submit(_run)
+    except Exception:
+        _BUSY.release()
+        raise
+    try:
+        scores = fut.result(timeout=budget)
+    except FutureTimeout:
+        log.warning("rerank exceeded %.0fms budget; keeping vector order", budget * 1000)
+        return rows, False
+    except Exception:
+        log.exception("rerank failed; keeping vector order")
+        return rows, False
+    order = sorted(range(len(rows)), key=lambda i: scores[i], reverse=True)
+    return [rows[i] for i in order], True
@@ -0,0 +1,75 @@
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+import numpy as np
+from app.config import settings
+from app.services.embedding import embed_batch
+
+_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+_TERM = re.compile(r"\w+")
+_STOP = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this to was were what when "
+    "where which who why will with do does did can you your".split()
+)
+
+@lru_cache(maxsize=4096)
+def split_sentences(text: str) -> Tuple[str, ...]:
+    parts = _SPLIT.split((text or "").strip())
+    return tuple(p.strip() for p in parts if p.strip())
+
+def terms(text: str) -> List[str]:
+    return [t for t in _TERM.findall(text.lower()) if t not in _STOP]
+
+class ChunkSentences:
+    """Sentence split, per-sentence term counts and (lazily) unit-norm sentence embeddings of one chunk."""
+    __slots__ = ("sents", "tf", "lens", "vecs")
+
+    def __init__(self, text: str):
+        self.sents = split_sentences(text)
+        self.tf = tuple(Counter(terms(s)) for s in self.sents)
+        self.lens = np.fromiter((sum(c.values()) for c in self.tf), dtype=np.float32, count=len(self.tf))
+        self.vecs: np.ndarray | None = None
+
+_lock = threading.Lock()
+_cache: "OrderedDict[str, ChunkSentences]" = OrderedDict()
+
+def _key(row) -> str:
+    return getattr(row, "sha256", None) or hashlib.sha256((row.text or "").encode("utf-8")).hexdigest()
+
+def chunk_sentences(rows: Iterable) -> List[ChunkSentences]:
+    """Cached ChunkSentences per chunk row, keyed by content hash (LRU, SENTENCE_CACHE_SIZE)."""
+    out = []
+    with _lock:
+        for r in rows:
+            k = _key(r)
+            e = _cache.get(k)
+            if e is None:
+                e = _cache[k] = ChunkSentences(r.text or "")
+            else:
+                _cache.move_to_end(k)
+            out.append(e)
+        while len(_cache) > settings.SENTENCE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return out
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    return m / (np.linalg.norm(m, axis=1, keepdims=True) + 1e-12)
+
+def embed_sentences(entries: List[ChunkSentences], extra: List[str] = (), *, api_key: str | None = None) -> np.ndarray:
+    """
+    Fill in missing sentence embeddings of `entries` and embed `extra` texts,
+    all in one embed_batch call. Returns the unit-norm embeddings of `extra`.
+    """
+    todo = [e for e in entries if e.vecs is None and e.sents]
+    flat = [s for e in todo for s in e.sents] + list(extra)
+    if not flat:
+        return np.zeros((0, 0), dtype=np.float32)
+    embs = _unit(np.asarray(embed_batch(flat, model=settings.EMBEDDING_MODEL, api_key=api_key), dtype=np.float32))
+    off = 0
+    for e in todo:
+        e.vecs = embs[off:off + len(e.sents)]
+        off += len(e.sents)
+    return embs[off:]
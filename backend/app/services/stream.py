@@ -1,5 +1,74 @@
-from typing import Iterable
+import re
+from typing import Any, AsyncIterable, Iterable
+import orjson
 from fastapi.responses import StreamingResponse
 
 def text_stream(generator: Iterable[str]):
     return StreamingResponse(generator, media_type="text/plain; charset=utf-8")
+
+def ndjson_stream(generator: AsyncIterable[bytes] | Iterable[bytes]):
+    return StreamingResponse(generator, media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+def ndjson_line(data: Any) -> bytes:
+    return orjson.dumps(data) + b"\n"
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+def sse_stream(generator: AsyncIterable[str]):
+    return StreamingResponse(
+        generator,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class JsonFieldStreamer:
+    """
+    Pulls the value of one string field out of a JSON object that arrives in
+    fragments (e.g. a streamed json_object completion), returning newly decoded
+    characters on each feed(). The full raw text is kept in `.text`.
+    """
+    def __init__(self, field: str):
+        self._marker = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buf = ""
+        self._pos = 0
+        self._state = "seek"  # seek | value | done
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, delta: str) -> str:
+        self._buf += delta
+        if self._state == "seek":
+            m = self._marker.search(self._buf)
+            if not m: return ""
+            self._pos, self._state = m.end(), "value"
+        if self._state != "value": return ""
+
+        b, i, out = self._buf, self._pos, []
+        while i < len(b):
+            c = b[i]
+            if c == '"':
+                self._state = "done"; i += 1
+                break
+            if c != "\\":
+                out.append(c); i += 1
+                continue
+            if i + 1 >= len(b): break
+            e = b[i + 1]
+            if e != "u":
+                out.append(_ESCAPES.get(e, e)); i += 2
+                continue
+            if i + 6 > len(b): break
+            cp = int(b[i + 2:i + 6], 16)
+            if 0xD800 <= cp < 0xDC00:  # surrogate pair: wait for the low half
+                if i + 12 > len(b): break
+                lo = int(b[i + 8:i + 12], 16)
+                out.append(chr(0x10000 + ((cp - 0xD800) << 10) + (lo - 0xDC00))); i += 12
+                continue
+            out.append(chr(cp)); i += 6
+        self._pos = i
+        return "".join(out)
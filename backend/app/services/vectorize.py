@@ -1,52 +1,213 @@
-import time, logging
-from typing import Iterable
+import time, logging, uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
 from app.config import settings
-from app.services.embedding import embed_batch
+from app.db import crud, models
+from app.services.embedding import embed_batch, embedding_dimension
 from app.services.pinecone_client import get_index
 from app.services.embed_gate import embed_gate
 
 log = logging.getLogger("app.vectorize")
 
+UPSERT_BATCH = 100
+DELETE_BATCH = 1000   # Pinecone's limit on ids per delete
+
 def make_vector_id(workspace: str, document_id: str, chunk_id: str) -> str:
     return f"{workspace}:{document_id}:{chunk_id}"
 
-def vectorize_and_upsert(
+def make_vector(workspace: str, document_id: str, filename: str, chunk_id: str, idx: int, vec) -> dict:
+    return {
+        "id": make_vector_id(workspace, document_id, chunk_id),
+        "values": vec,
+        "metadata": {
+            "workspace_id": workspace,
+            "document_id": document_id,
+            "chunk_id": chunk_id,
+            "idx": idx,
+            "filename": filename,
+        }
+    }
+
+def _submit(pool: ThreadPoolExecutor | None, fn, *args, **kwargs) -> Future:
+    if pool is not None:
+        return pool.submit(fn, *args, **kwargs)
+    f: Future = Future()
+    try:
+        f.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        f.set_exception(e)
+    return f
+
+def _batches(items: list, n: int) -> List[list]:
+    return [items[i:i + n] for i in range(0, len(items), n)]
+
+def document_vector_ids(db: Session, workspace: str, document_ids: List[uuid.UUID]) -> Dict[uuid.UUID, List[str]]:
+    """Every vector id a document may own: its chunks' deterministic ids plus recorded ones of chunks since removed."""
+    c, r = models.Chunk, models.VectorRecord
+    out: Dict[uuid.UUID, set] = {d: set() for d in document_ids}
+    if document_ids:
+        for row in db.execute(select(c.document_id, c.id).where(c.document_id.in_(document_ids))):
+            out[row.document_id].add(make_vector_id(workspace, str(row.document_id), str(row.id)))
+        for row in db.execute(select(r.document_id, r.vector_id).where(r.document_id.in_(document_ids))):
+            out[row.document_id].add(row.vector_id)
+    return {d: sorted(v) for d, v in out.items()}
+
+def delete_vectors(workspace: str, owned: Dict[Any, List[str]], pool: ThreadPoolExecutor | None = None) -> Dict[Any, str]:
+    """
+    Delete vectors by explicit id, DELETE_BATCH ids per call, batches in
+    parallel. `owned` maps an owner (document, chunk) to its ids; failures are
+    returned per owner.
+    """
+    pairs = [(k, vid) for k, ids in owned.items() for vid in ids]
+    if not pairs:
+        return {}
+    idx, failed = get_index(), {}
+    own = pool is None
+    pool = pool or ThreadPoolExecutor(max_workers=max(1, settings.VECTOR_DELETE_CONCURRENCY), thread_name_prefix="vector-delete")
+    try:
+        for batch, f in [(b, pool.submit(idx.delete, ids=[v for _, v in b], namespace=workspace)) for b in _batches(pairs, DELETE_BATCH)]:
+            try:
+                f.result()
+            except Exception as e:
+                for k, _ in batch:
+                    failed.setdefault(k, f"vector delete failed: {e}")
+    finally:
+        if own:
+            pool.shutdown()
+    return failed
+
+def clear_documents(db: Session, *, workspace: str, document_ids: List[uuid.UUID],
+                    pool: ThreadPoolExecutor | None = None) -> Dict[uuid.UUID, str]:
+    """Drop every vector of these documents (by id) and their records; returns failures per document."""
+    failed = delete_vectors(workspace, document_vector_ids(db, workspace, document_ids), pool)
+    cleared = [d for d in document_ids if d not in failed]
+    if cleared:
+        db.execute(delete(models.VectorRecord).where(models.VectorRecord.document_id.in_(cleared)))
+        crud.refresh_document_counts(db, cleared)
+        db.commit()
+    return failed
+
+def sync_documents(
+    db: Session,
     *,
     workspace: str,
-    document_id: str,
-    filename: str,
-    chunks: Iterable,   # list of ORM Chunk rows
-    openai_key: str | None,          # only used if provider='openai'
-) -> int:
-    texts = [c.text for c in chunks]
-    if not texts: return 0
+    filenames: Dict[uuid.UUID, str],   # document id -> filename (vector metadata)
+    openai_key: str | None,            # only used if provider='openai'
+    force: bool = False,
+    pool: ThreadPoolExecutor | None = None,
+) -> Dict[str, Any]:
+    """
+    Bring the vectors of these documents in line with their chunks, using
+    vector_records as the ledger of what the index holds. Only chunks that are
+    new, changed (sha256) or embedded with another model/dimension are embedded;
+    chunks that merely moved get their idx metadata updated; vectors of chunks
+    that no longer exist are deleted by id. `force` re-embeds every chunk.
+    Failures are reported per document instead of raised.
+    """
+    c, r = models.Chunk, models.VectorRecord
+    ids = list(filenames)
+    model, dim = settings.EMBEDDING_MODEL, embedding_dimension()
+    chunks = db.execute(
+        select(c.id, c.document_id, c.idx, c.sha256).where(c.document_id.in_(ids)).order_by(c.document_id, c.idx)
+    ).all() if ids else []
+    recs = {x.chunk_id: x for x in db.execute(
+        select(r.chunk_id, r.document_id, r.vector_id, r.sha256, r.idx, r.model, r.dim).where(r.document_id.in_(ids))
+    )} if ids else {}
+    embed, moved = [], []
+    for ch in chunks:
+        rec = recs.pop(ch.id, None)
+        if force or rec is None or (rec.sha256, rec.model, rec.dim) != (ch.sha256, model, dim):
+            embed.append(ch)
+        elif rec.idx != ch.idx:
+            moved.append(ch)
+    stale = list(recs.values())
 
     idx = get_index()
-    vectors: list[dict] = []
-    B = settings.EMBEDDING_BATCH
-    delay = max(0.0, settings.EMBED_REQUEST_DELAY_S)
+    failed: Dict[uuid.UUID, str] = {}
+    out = {
+        "with_chunks": {ch.document_id for ch in chunks},
+        "embedded": 0, "moved": 0, "deleted": 0,
+        "unchanged": len(chunks) - len(embed) - len(moved),
+        "failed": failed,
+    }
 
-    for start in range(0, len(texts), B):
-        batch_txt = texts[start:start+B]
+    # vectors of chunks that are gone
+    owned: Dict[uuid.UUID, List[str]] = {}
+    for x in stale:
+        owned.setdefault(x.document_id, []).append(x.vector_id)
+    failed.update(delete_vectors(workspace, owned, pool))
+    gone = [x.chunk_id for x in stale if x.document_id not in failed]
+    if gone:
+        db.execute(delete(r).where(r.chunk_id.in_(gone)))
+        out["deleted"] = len(gone)
+
+    # same text, new position: metadata only
+    relabeled = []
+    for ch, f in [(ch, _submit(pool, idx.update, id=make_vector_id(workspace, str(ch.document_id), str(ch.id)),
+                                set_metadata={"idx": ch.idx}, namespace=workspace)) for ch in moved]:
+        try:
+            f.result(); relabeled.append({"chunk_id": ch.id, "idx": ch.idx})
+        except Exception as e:
+            failed.setdefault(ch.document_id, f"metadata update failed: {e}")
+    if relabeled:
+        db.execute(update(r), relabeled)
+        out["moved"] = len(relabeled)
+
+    # new or changed chunks
+    texts = dict(db.execute(select(c.id, c.text).where(c.id.in_([ch.id for ch in embed]))).all()) if embed else {}
+
+    def _embed(batch):
         with embed_gate():
-            embs = embed_batch(batch_txt, model=settings.EMBEDDING_MODEL, api_key=openai_key)
-        for row, vec in zip(chunks[start:start+B], embs):
-            vectors.append({
-                "id": make_vector_id(workspace, document_id, str(row.id)),
-                "values": vec,
-                "metadata": {
-                    "workspace_id": workspace,
-                    "document_id": document_id,
-                    "chunk_id": str(row.id),
-                    "idx": row.idx,
-                    "filename": filename,
-                }
-            })
-        if delay: time.sleep(delay)
-
-    U = 100
-    for s in range(0, len(vectors), U):
-        idx.upsert(vectors=vectors[s:s+U], namespace=workspace)
-
-    log.info("upserted %d vectors for doc %s", len(vectors), document_id)
-    return len(vectors)
+            embs = embed_batch([texts[ch.id] for ch in batch], model=model, api_key=openai_key)
+        if settings.EMBED_REQUEST_DELAY_S > 0:
+            time.sleep(settings.EMBED_REQUEST_DELAY_S)
+        return embs
+
+    batches = _batches(embed, max(1, settings.EMBEDDING_BATCH))
+    vectors = []
+    for batch, f in [(b, _submit(pool, _embed, b)) for b in batches]:
+        try:
+            embs = f.result()
+        except Exception as e:
+            for ch in batch:
+                failed.setdefault(ch.document_id, f"embedding failed: {e}")
+            continue
+        vectors += [(ch, make_vector(workspace, str(ch.document_id), filenames[ch.document_id], str(ch.id), ch.idx, vec))
+                    for ch, vec in zip(batch, embs)]
+    vectors = [v for v in vectors if v[0].document_id not in failed]
+
+    written = []
+    for batch, f in [(b, _submit(pool, idx.upsert, vectors=[v for _, v in b], namespace=workspace))
+                     for b in _batches(vectors, UPSERT_BATCH)]:
+        try:
+            f.result()
+        except Exception as e:
+            for ch, _ in batch:
+                failed.setdefault(ch.document_id, f"upsert failed: {e}")
+            continue
+        written += [{"chunk_id": ch.id, "document_id": ch.document_id, "workspace_id": workspace, "vector_id": v["id"],
+                     "sha256": ch.sha256, "idx": ch.idx, "model": model, "dim": dim} for ch, v in batch]
+    if written:
+        stmt = pg_insert(r).values(written)
+        cols = ("document_id", "workspace_id", "vector_id", "sha256", "idx", "model", "dim")
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[r.chunk_id], set_={**{k: stmt.excluded[k] for k in cols}, "indexed_at": func.now()},
+        ))
+        out["embedded"] = len(written)
+    crud.refresh_document_counts(db, ids)
+    db.commit()
+
+    log.info("synced vectors for %d doc(s): %d embedded, %d moved, %d deleted, %d unchanged",
+             len(ids), out["embedded"], out["moved"], out["deleted"], out["unchanged"])
+    return out
+
+def sync_document(db: Session, *, workspace: str, document_id: uuid.UUID, filename: str,
+                  openai_key: str | None, force: bool = False) -> Dict[str, Any]:
+    """sync_documents for one document; raises when its vectors could not be written."""
+    res = sync_documents(db, workspace=workspace, filenames={document_id: filename}, openai_key=openai_key, force=force)
+    if res["failed"]:
+        raise RuntimeError(res["failed"][document_id])
+    return res
@@ -0,0 +1,69 @@
+import hashlib, logging, threading
+from datetime import timedelta
+from typing import Any, Dict
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import models
+
+log = logging.getLogger("app.web_cache")
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evicted": 0}
+
+def cache_key(kind: str, *parts: str) -> str:
+    h = hashlib.sha256()
+    for part in (kind, *parts):
+        h.update(part.encode("utf-8")); h.update(b"\x1f")
+    return h.hexdigest()
+
+def bump(name: str, n: int = 1) -> None:
+    with _lock: _stats[name] += n
+
+def get(db: Session, key: str) -> Dict[str, Any] | None:
+    """The entry with a `fresh` flag; stale entries are returned too so callers can revalidate them."""
+    t = models.WebCacheEntry
+    row = db.execute(
+        select(t.ok, t.data, t.etag, t.last_modified, (t.expires_at > func.now()).label("fresh")).where(t.key == key)
+    ).first()
+    return dict(row._mapping) if row else None
+
+def put(db: Session, key: str, *, kind: str, target: str, ok: bool, ttl_s: int,
+        data: Dict[str, Any] | None = None, etag: str | None = None, last_modified: str | None = None) -> None:
+    t = models.WebCacheEntry
+    values = dict(kind=kind, target=target, ok=ok, data=data, etag=etag, last_modified=last_modified,
+                  fetched_at=func.now(), expires_at=func.now() + timedelta(seconds=ttl_s))
+    stmt = pg_insert(t).values(key=key, **values)
+    stmt = stmt.on_conflict_do_update(index_elements=[t.key], set_={k: stmt.excluded[k] for k in values})
+    db.execute(stmt); db.commit()
+    with _lock:
+        _stats["stores"] += 1
+        due = _stats["stores"] % max(1, settings.WEB_CACHE_EVICT_EVERY) == 0
+    if due:
+        evict(db)
+
+def touch(db: Session, key: str, ttl_s: int) -> None:
+    """A conditional request came back 304: the cached copy is good for another TTL."""
+    t = models.WebCacheEntry
+    db.execute(update(t).where(t.key == key).values(fetched_at=func.now(), expires_at=func.now() + timedelta(seconds=ttl_s)))
+    db.commit()
+    bump("revalidated")
+
+def evict(db: Session) -> int:
+    """Drop entries expired for longer than WEB_CACHE_KEEP_STALE_S (kept until then for revalidation)."""
+    t = models.WebCacheEntry
+    cutoff = func.now() - timedelta(seconds=settings.WEB_CACHE_KEEP_STALE_S)
+    n = db.execute(delete(t).where(t.expires_at <= cutoff)).rowcount or 0
+    db.commit()
+    if n:
+        bump("evicted", n)
+        log.info("evicted %d web cache entries", n)
+    return n
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["negative_hits"] + out["misses"] + out["revalidated"]
+    out["hit_rate"] = round((out["hits"] + out["negative_hits"] + out["revalidated"]) / lookups, 4) if lookups else 0.0
+    return out
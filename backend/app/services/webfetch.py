@@ -0,0 +1,181 @@
+import asyncio
+import codecs
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import httpx
+from sqlalchemy.exc import SQLAlchemyError
+from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services import web_cache
+from app.services.html_text import TextExtractor
+
+log = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+_domain_sems: Dict[str, asyncio.Semaphore] = {}
+_TEXT_TYPES = ("text/html", "text/plain", "application/xhtml+xml")
+
+def get_client() -> httpx.AsyncClient:
+    """Shared pooled client for web enrichment (keep-alive across topics, pages and requests)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            headers={"User-Agent": settings.ENRICH_USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=settings.ENRICH_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ENRICH_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+@asynccontextmanager
+async def domain_slot(url: str):
+    """At most ENRICH_PER_DOMAIN_CONCURRENCY requests in flight per host."""
+    host = urlparse(url).netloc.lower()
+    sem = _domain_sems.get(host)
+    if sem is None:
+        if len(_domain_sems) > 1024:
+            for h in [h for h, s in _domain_sems.items() if not s.locked()]:
+                del _domain_sems[h]
+        sem = _domain_sems[host] = asyncio.Semaphore(settings.ENRICH_PER_DOMAIN_CONCURRENCY)
+    async with sem:
+        yield
+
+def _timeout(total: float) -> httpx.Timeout:
+    return httpx.Timeout(total, connect=min(total, 3.0))
+
+async def _cached(fn, *args, **kwargs):
+    # the cache is an optimization: a failing cache database must not fail enrichment
+    try:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+    except SQLAlchemyError:
+        log.warning("web cache unavailable", exc_info=True)
+        return None
+
+def _negative(exc: Exception) -> bool:
+    # a timeout usually means our own budget was short, not that the target is bad
+    return not isinstance(exc, httpx.TimeoutException)
+
+async def cse_search(topic: str, *, timeout: float) -> List[dict]:
+    """
+    Google CSE results for a topic. With WEB_CACHE_ENABLED results are kept per
+    (cx, topic) for WEB_CACHE_SEARCH_TTL_S and failures for WEB_CACHE_NEGATIVE_TTL_S.
+    """
+    if not settings.GOOGLE_CSE_API_KEY or not settings.GOOGLE_CSE_CX:
+        return []
+    key = web_cache.cache_key("search", settings.GOOGLE_CSE_CX, " ".join(topic.lower().split()))
+    if settings.WEB_CACHE_ENABLED:
+        hit = await _cached(web_cache.get, key)
+        if hit and hit["fresh"]:
+            web_cache.bump("hits" if hit["ok"] else "negative_hits")
+            return (hit["data"] or {}).get("items", []) if hit["ok"] else []
+        web_cache.bump("misses")
+    params = {"key": settings.GOOGLE_CSE_API_KEY, "cx": settings.GOOGLE_CSE_CX, "q": topic, "num": 3}
+    try:
+        r = await get_client().get(settings.GOOGLE_CSE_URL, params=params, timeout=_timeout(timeout))
+        r.raise_for_status()
+        items = r.json().get("items", []) or []
+    except (httpx.HTTPError, ValueError) as e:
+        if settings.WEB_CACHE_ENABLED and _negative(e):
+            await _cached(web_cache.put, key, kind="search", target=topic, ok=False, ttl_s=settings.WEB_CACHE_NEGATIVE_TTL_S)
+        raise
+    out = [{"title": it.get("title"), "url": it.get("link")} for it in items if it.get("link")]
+    if settings.WEB_CACHE_ENABLED:
+        await _cached(web_cache.put, key, kind="search", target=topic, ok=True,
+                      ttl_s=settings.WEB_CACHE_SEARCH_TTL_S, data={"items": out})
+    return out
+
+def _usable(text: str | None) -> Optional[str]:
+    return text if text and len(text) > 500 else None
+
+async def _read_text(r: httpx.Response, max_bytes: int, max_chars: int) -> str:
+    """
+    Decode and extract the body as it arrives; stops at `max_bytes` read or
+    `max_chars` extracted, so memory per page stays bounded.
+    """
+    ctype = r.headers.get("content-type", "text/html").split(";")[0].strip().lower()
+    ex = TextExtractor(max_chars, html=ctype != "text/plain")
+    decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+    read = 0
+    async for part in r.aiter_bytes():
+        part = part[:max_bytes - read]
+        read += len(part)
+        ex.feed(decoder.decode(part))
+        if ex.full or read >= max_bytes:
+            break
+    else:
+        ex.feed(decoder.decode(b"", final=True))
+    return ex.text()
+
+async def fetch_text(url: str, *, timeout: float, max_bytes: int | None = None) -> Optional[str]:
+    """
+    Stream a page under the per-domain limit and convert it to text while it
+    downloads: script/style/navigation elements are dropped, and reading stops
+    at `max_bytes` (ENRICH_MAX_PAGE_BYTES) or ENRICH_MAX_PAGE_CHARS of text.
+    `timeout` bounds the whole fetch, not just each read; non-text responses
+    are dropped after the headers. Returns None on any failure or for short pages.
+    With WEB_CACHE_ENABLED the extracted text is cached per URL; stale entries
+    are revalidated with If-None-Match / If-Modified-Since and failures are
+    cached negatively.
+    """
+    cap = max_bytes or settings.ENRICH_MAX_PAGE_BYTES
+    key, hit, headers = web_cache.cache_key("page", url), None, {}
+    if settings.WEB_CACHE_ENABLED:
+        hit = await _cached(web_cache.get, key)
+        if hit and hit["fresh"]:
+            web_cache.bump("hits" if hit["ok"] else "negative_hits")
+            return _usable((hit["data"] or {}).get("text")) if hit["ok"] else None
+        if hit and hit["ok"]:
+            if hit["etag"]: headers["If-None-Match"] = hit["etag"]
+            if hit["last_modified"]: headers["If-Modified-Since"] = hit["last_modified"]
+        if not headers:
+            web_cache.bump("misses")
+
+    async def _remember(ok: bool, text: str | None = None, r: httpx.Response | None = None):
+        if settings.WEB_CACHE_ENABLED:
+            await _cached(
+                web_cache.put, key, kind="page", target=url, ok=ok,
+                ttl_s=settings.WEB_CACHE_PAGE_TTL_S if ok else settings.WEB_CACHE_NEGATIVE_TTL_S,
+                data={"text": text} if ok else None,
+                etag=r.headers.get("etag") if r is not None else None,
+                last_modified=r.headers.get("last-modified") if r is not None else None,
+            )
+
+    async def _fetch():
+        async with domain_slot(url):
+            async with get_client().stream("GET", url, headers=headers, timeout=_timeout(timeout)) as r:
+                if r.status_code == 304 and hit:
+                    return r, None
+                if r.status_code >= 400:
+                    return None, None
+                ctype = r.headers.get("content-type", "text/html").split(";")[0].strip().lower()
+                if ctype not in _TEXT_TYPES:
+                    return None, None
+                return r, await _read_text(r, cap, settings.ENRICH_MAX_PAGE_CHARS)
+
+    try:
+        r, text = await asyncio.wait_for(_fetch(), timeout)
+    except asyncio.TimeoutError:
+        return None
+    except (httpx.HTTPError, UnicodeError, LookupError) as e:
+        if _negative(e):
+            await _remember(False)
+        return None
+    if r is None:
+        await _remember(False)
+        return None
+    if text is None:
+        await _cached(web_cache.touch, key, settings.WEB_CACHE_PAGE_TTL_S)
+        return _usable((hit["data"] or {}).get("text"))
+    await _remember(True, text, r)
+    return _usable(text)
@@ -0,0 +1,40 @@
+"""llm completion cache
+
+Revision ID: a41c7e2b9d13
+Revises: 6f2d580cbd70
+Create Date: 2026-10-19 09:12:44.318202
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e2b9d13'
+down_revision: Union[str, Sequence[str], None] = '6f2d580cbd70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('llm_completions',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(length=128), nullable=False),
+    sa.Column('response', sa.JSON(), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_llm_completions_created_at'), 'llm_completions', ['created_at'], unique=False)
+    op.create_index(op.f('ix_llm_completions_last_used_at'), 'llm_completions', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_llm_completions_last_used_at'), table_name='llm_completions')
+    op.drop_index(op.f('ix_llm_completions_created_at'), table_name='llm_completions')
+    op.drop_table('llm_completions')
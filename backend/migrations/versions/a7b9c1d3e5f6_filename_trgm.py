@@ -0,0 +1,29 @@
+"""pg_trgm GIN index on documents.filename
+
+Revision ID: a7b9c1d3e5f6
+Revises: f6a8b0c2d4e5
+Create Date: 2026-10-19 20:08:52.670213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b9c1d3e5f6'
+down_revision: Union[str, Sequence[str], None] = 'f6a8b0c2d4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_documents_filename_trgm', 'documents', ['filename'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'filename': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_filename_trgm', table_name='documents', postgresql_using='gin')
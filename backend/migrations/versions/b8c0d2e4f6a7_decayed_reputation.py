@@ -0,0 +1,50 @@
+"""decayed document reputation, chunk reputation, queries.used_document_ids
+
+Revision ID: b8c0d2e4f6a7
+Revises: a7b9c1d3e5f6
+Create Date: 2026-10-19 21:02:17.335916
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c0d2e4f6a7'
+down_revision: Union[str, Sequence[str], None] = 'a7b9c1d3e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('queries', sa.Column('used_document_ids', postgresql.ARRAY(sa.UUID()), nullable=True))
+    op.add_column('document_reputation', sa.Column('up_weight', sa.Float(), server_default='0', nullable=False))
+    op.add_column('document_reputation', sa.Column('down_weight', sa.Float(), server_default='0', nullable=False))
+    # existing votes start decaying from their last update
+    op.execute("UPDATE document_reputation SET up_weight = up_count, down_weight = down_count")
+    op.create_table('chunk_reputation',
+    sa.Column('chunk_id', sa.UUID(), nullable=False),
+    sa.Column('workspace_id', sa.String(length=64), nullable=False),
+    sa.Column('up_count', sa.Integer(), nullable=False),
+    sa.Column('down_count', sa.Integer(), nullable=False),
+    sa.Column('up_weight', sa.Float(), nullable=False),
+    sa.Column('down_weight', sa.Float(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['chunk_id'], ['chunks.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('chunk_id')
+    )
+    op.create_index(op.f('ix_chunk_reputation_workspace_id'), 'chunk_reputation', ['workspace_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_chunk_reputation_workspace_id'), table_name='chunk_reputation')
+    op.drop_table('chunk_reputation')
+    op.drop_column('document_reputation', 'down_weight')
+    op.drop_column('document_reputation', 'up_weight')
+    op.drop_column('queries', 'used_document_ids')
@@ -0,0 +1,43 @@
+"""web search and page cache, documents storage_uri index
+
+Revision ID: c3d9e5f1a7b2
+Revises: a41c7e2b9d13
+Create Date: 2026-10-19 14:02:17.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9e5f1a7b2'
+down_revision: Union[str, Sequence[str], None] = 'a41c7e2b9d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('web_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('target', sa.Text(), nullable=False),
+    sa.Column('ok', sa.Boolean(), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('etag', sa.String(length=512), nullable=True),
+    sa.Column('last_modified', sa.String(length=64), nullable=True),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_web_cache_expires_at'), 'web_cache', ['expires_at'], unique=False)
+    op.create_index('ix_documents_workspace_storage_uri', 'documents', ['workspace_id', 'storage_uri'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_workspace_storage_uri', table_name='documents')
+    op.drop_index(op.f('ix_web_cache_expires_at'), table_name='web_cache')
+    op.drop_table('web_cache')
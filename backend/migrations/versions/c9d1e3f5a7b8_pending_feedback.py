@@ -0,0 +1,40 @@
+"""pending_feedback for queries still in another worker's write-behind buffer
+
+Revision ID: c9d1e3f5a7b8
+Revises: b8c0d2e4f6a7
+Create Date: 2026-10-19 22:14:40.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d1e3f5a7b8'
+down_revision: Union[str, Sequence[str], None] = 'b8c0d2e4f6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pending_feedback',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('query_id', sa.UUID(), nullable=False),
+    sa.Column('workspace_id', sa.String(length=64), nullable=False),
+    sa.Column('rating', sa.Integer(), nullable=False),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_pending_feedback_query_id'), 'pending_feedback', ['query_id'], unique=False)
+    op.create_index(op.f('ix_pending_feedback_created_at'), 'pending_feedback', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_pending_feedback_created_at'), table_name='pending_feedback')
+    op.drop_index(op.f('ix_pending_feedback_query_id'), table_name='pending_feedback')
+    op.drop_table('pending_feedback')
@@ -0,0 +1,50 @@
+"""background reindex jobs
+
+Revision ID: d4e6f8a0b2c3
+Revises: c3d9e5f1a7b2
+Create Date: 2026-10-19 16:40:05.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e6f8a0b2c3'
+down_revision: Union[str, Sequence[str], None] = 'c3d9e5f1a7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('reindex_jobs',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('workspace_id', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('force', sa.Boolean(), nullable=False),
+    sa.Column('clear_first', sa.Boolean(), nullable=False),
+    sa.Column('document_ids', postgresql.ARRAY(sa.UUID()), nullable=False),
+    sa.Column('done_ids', postgresql.ARRAY(sa.UUID()), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('skipped', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('chunks', sa.Integer(), nullable=False),
+    sa.Column('elapsed_s', sa.Float(), nullable=False),
+    sa.Column('errors', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_reindex_jobs_workspace_created', 'reindex_jobs', ['workspace_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reindex_jobs_workspace_created', table_name='reindex_jobs')
+    op.drop_table('reindex_jobs')
@@ -0,0 +1,42 @@
+"""per-chunk vector records
+
+Revision ID: e5f7a9b1c3d4
+Revises: d4e6f8a0b2c3
+Create Date: 2026-10-19 18:12:44.390127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f7a9b1c3d4'
+down_revision: Union[str, Sequence[str], None] = 'd4e6f8a0b2c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('vector_records',
+    sa.Column('chunk_id', sa.UUID(), nullable=False),
+    sa.Column('document_id', sa.UUID(), nullable=False),
+    sa.Column('workspace_id', sa.String(length=64), nullable=False),
+    sa.Column('vector_id', sa.String(length=256), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+    sa.Column('idx', sa.Integer(), nullable=False),
+    sa.Column('model', sa.String(length=128), nullable=False),
+    sa.Column('dim', sa.Integer(), nullable=False),
+    sa.Column('indexed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('chunk_id')
+    )
+    op.create_index(op.f('ix_vector_records_document_id'), 'vector_records', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_vector_records_document_id'), table_name='vector_records')
+    op.drop_table('vector_records')
@@ -0,0 +1,37 @@
+"""denormalized chunk/vector counts on documents, keyset index
+
+Revision ID: f6a8b0c2d4e5
+Revises: e5f7a9b1c3d4
+Create Date: 2026-10-19 19:25:31.804412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a8b0c2d4e5'
+down_revision: Union[str, Sequence[str], None] = 'e5f7a9b1c3d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('chunk_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('documents', sa.Column('vector_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE documents d SET
+            chunk_count = (SELECT count(*) FROM chunks c WHERE c.document_id = d.id),
+            vector_count = (SELECT count(*) FROM vector_records v WHERE v.document_id = d.id)
+    """)
+    op.create_index('ix_documents_workspace_created_id', 'documents', ['workspace_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_workspace_created_id', table_name='documents')
+    op.drop_column('documents', 'vector_count')
+    op.drop_column('documents', 'chunk_count')
@@ -3,7 +3,7 @@ import {
   listDocuments,
   reindexDocuments,
   reindexOneDocument,
-  deleteDocument
+  deleteDocuments
 } from '../utils/api'
 import { useSettings } from '../context/SettingsContext'
 import ConfirmDialog from './ConfirmDialog'
@@ -62,8 +62,8 @@ export default function DocumentsManager() {
 
   async function doReindexPending() {
     notify.promise(
-      reindexDocuments({ all_pending: true, clear_first: true }, { apiKey })
-        .then(res => { fetchDocs(); return `Reindexed ${res.updated} document(s)` }),
+      reindexDocuments({ all_pending: true }, { apiKey })
+        .then(res => { fetchDocs(); return `Reindexed ${res.processed} document(s)${res.failed ? ` • Failed ${res.failed}` : ''}` }),
       { loading: 'Reindexing pending…' }
     )
   }
@@ -72,15 +72,15 @@ export default function DocumentsManager() {
     const ids = Object.keys(selected).filter(k => selected[k])
     if (ids.length === 0) return notify.info('Select at least one document')
     notify.promise(
-      reindexDocuments({ document_ids: ids, force: true, clear_first: true }, { apiKey })
-        .then(res => { fetchDocs(); return `Reindexed ${res.updated} document(s)` }),
+      reindexDocuments({ document_ids: ids, force: true }, { apiKey })
+        .then(res => { fetchDocs(); return `Reindexed ${res.processed} document(s)${res.failed ? ` • Failed ${res.failed}` : ''}` }),
       { loading: 'Reindexing selected…' }
     )
   }
 
   async function doReindexOne(id) {
     notify.promise(
-      reindexOneDocument(id, { clearFirst: true, force: true }, { apiKey })
+      reindexOneDocument(id, {}, { apiKey })
         .then(() => { fetchDocs(); return 'Reindexed' }),
       { loading: 'Reindexing…' }
     )
@@ -96,11 +96,10 @@ export default function DocumentsManager() {
     const ids = confirm.ids
     setConfirm({ open: false, ids: [] })
     notify.promise(
-      Promise.allSettled(ids.map(id => deleteDocument(id, { clearVectors }))).then(results => {
-        const ok = results.filter(r => r.status === 'fulfilled').length
-        const fail = results.length - ok
+      deleteDocuments(ids, { clearVectors }).then(res => {
+        const fail = Object.keys(res.failed || {}).length
         fetchDocs()
-        return `Deleted ${ok} • Failed ${fail}`
+        return `Deleted ${res.deleted} • Failed ${fail}`
       }),
       { loading: 'Deleting…', success: (msg) => msg }
     )
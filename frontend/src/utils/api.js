@@ -66,17 +66,29 @@ export async function listDocumentChunks(docId, { limit = 50, offset = 0, includ
   return res.data
 }
 
-export async function reindexDocuments(payload = {}, { apiKey } = {}) {
+export async function getReindexJob(jobId) {
+  const res = await axios.get(`${getBase()}/api/reindex/jobs/${jobId}`)
+  return res.data
+}
+
+// Starts a background reindex job and resolves with the job once it has finished.
+export async function reindexDocuments(payload = {}, { apiKey, onProgress, intervalMs = 1000 } = {}) {
   const res = await axios.post(`${getBase()}/api/reindex`, payload, {
     headers: {
       'Content-Type': 'application/json',
       ...(apiKey ? { 'X-OpenAI-Key': apiKey } : {})
     }
   })
-  return res.data
+  let job = res.data
+  while (['pending', 'running', 'cancelling'].includes(job.status)) {
+    await new Promise(r => setTimeout(r, intervalMs))
+    job = await getReindexJob(job.job_id)
+    if (onProgress) onProgress(job)
+  }
+  return job
 }
 
-export async function reindexOneDocument(docId, { clearFirst = true, force = true } = {}, { apiKey } = {}) {
+export async function reindexOneDocument(docId, { clearFirst = false, force = false } = {}, { apiKey } = {}) {
   const params = new URLSearchParams()
   if (clearFirst) params.set('clear_first', 'true')
   if (force) params.set('force', 'true')
@@ -96,6 +108,11 @@ export async function deleteDocument(docId, { clearVectors = true } = {}) {
   return res.data
 }
 
+export async function deleteDocuments(ids, { clearVectors = true } = {}) {
+  const res = await axios.post(`${getBase()}/api/documents/bulk-delete`, { document_ids: ids, clear_vectors: clearVectors })
+  return res.data
+}
+
 export async function sendFeedback({ query_id, rating, comment = '' }) {
   const res = await axios.post(`${getBase()}/api/feedback`, { query_id, rating, comment }, {
     headers: { 'Content-Type': 'application/json' }